@@ -1,136 +1,33 @@
-import json
-import re
 from pathlib import Path
 from datetime import datetime
 from flask import Blueprint, request, jsonify
 from werkzeug.utils import secure_filename
 from backend.services.rag_service import refresh_retriever
+from backend.services.extraction_service import get_text_preview, remove_extracted_text
+from backend.services.ingestion_service import (
+    load_metadata,
+    update_document_metadata,
+    remove_document_metadata,
+    submit_document,
+    get_job,
+)
 
 documents_bp = Blueprint('documents', __name__)
 
 # Path configuration
 BASE_DIR = Path(__file__).resolve().parents[1]
 DOCS_PATH = BASE_DIR / "data" / "docs"
-CONVERTED_PATH = BASE_DIR / "data" / "docs_converted"
-METADATA_PATH = BASE_DIR / "data" / "docs_metadata.json"
 
 # Accept all file types - no restrictions
 ALLOWED_EXTENSIONS = None  # Accept everything
 
 # Ensure directories exist
 DOCS_PATH.mkdir(parents=True, exist_ok=True)
-CONVERTED_PATH.mkdir(parents=True, exist_ok=True)
 
 def allowed_file(filename):
     # Accept all files
     return True
 
-def load_metadata():
-    """Load document metadata from JSON file"""
-    if METADATA_PATH.exists():
-        with open(METADATA_PATH, 'r') as f:
-            return json.load(f)
-    return {}
-
-def save_metadata(metadata):
-    """Save document metadata to JSON file"""
-    with open(METADATA_PATH, 'w') as f:
-        json.dump(metadata, f, indent=2)
-
-def extract_text_from_file(file_path):
-    """Extract text content from various file formats"""
-    file_extension = file_path.suffix.lower()
-
-    try:
-        # Plain text files
-        if file_extension in ['.txt', '.md', '.log', '.csv', '.json', '.xml', '.html', '.htm']:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read()
-
-        # PDF files
-        elif file_extension == '.pdf':
-            try:
-                import PyPDF2
-                text = []
-                with open(file_path, 'rb') as f:
-                    pdf_reader = PyPDF2.PdfReader(f)
-                    for page in pdf_reader.pages:
-                        text.append(page.extract_text())
-                return '\n'.join(text)
-            except ImportError:
-                # Fallback: read as binary and decode
-                with open(file_path, 'rb') as f:
-                    return f.read().decode('utf-8', errors='ignore')
-
-        # DOCX files
-        elif file_extension == '.docx':
-            try:
-                import docx
-                doc = docx.Document(file_path)
-                return '\n'.join([paragraph.text for paragraph in doc.paragraphs])
-            except ImportError:
-                # Fallback: read as text
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    return f.read()
-
-        # DOC files (older Word format)
-        elif file_extension == '.doc':
-            try:
-                import pypandoc
-                return pypandoc.convert_file(str(file_path), 'plain')
-            except (ImportError, RuntimeError):
-                # Fallback: read as text
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    return f.read()
-
-        # Other files - try reading as text
-        else:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read()
-
-    except Exception as e:
-        print(f"Error extracting text from {file_path}: {e}")
-        # Last resort: read as binary and decode
-        try:
-            with open(file_path, 'rb') as f:
-                return f.read().decode('utf-8', errors='ignore')
-        except:
-            return f"[Unable to extract text from {file_path.name}]"
-
-def convert_to_txt(original_path, converted_path):
-    """Convert any file to .txt format for RAG system"""
-    text_content = extract_text_from_file(original_path)
-
-    # Save as .txt file
-    txt_filename = original_path.stem + '.txt'
-    txt_path = converted_path / txt_filename
-
-    with open(txt_path, 'w', encoding='utf-8') as f:
-        f.write(text_content)
-
-    return txt_path, text_content
-
-def scan_document(filename, content):
-    """Basic security scanning for documents"""
-    issues = []
-
-    # Check for PII patterns
-    email_pattern = r'\b[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}\b'
-    phone_pattern = r'\b\d{10,15}\b'
-
-    if re.search(email_pattern, content, re.IGNORECASE):
-        issues.append("PII: Email detected")
-    if re.search(phone_pattern, content):
-        issues.append("PII: Phone number detected")
-
-    # Check for potential injection patterns
-    injection_keywords = ['<script>', 'javascript:', 'onerror=', 'eval(', 'exec(']
-    for keyword in injection_keywords:
-        if keyword.lower() in content.lower():
-            issues.append(f"Injection: {keyword} detected")
-
-    return issues
-
 @documents_bp.route('/documents', methods=['GET'])
 def get_documents():
     """Get all documents with metadata"""
@@ -186,56 +83,25 @@ def upload_document():
         # Save the file in its original format (no conversion)
         file.save(str(file_path))
 
-        # Extract text content for scanning only (don't save as .txt)
-        try:
-            text_content = extract_text_from_file(file_path)
-        except Exception as e:
-            # If extraction fails, try to read as text directly
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    text_content = f.read()
-            except:
-                text_content = f"[Error processing file: {e}]"
-
-        # Scan document for issues
-        issues = scan_document(filename, text_content)
-
-        # Determine sensitivity: use provided parameter, otherwise auto-detect
-        provided_sensitivity = request.form.get('sensitivity', '').lower()
-        if provided_sensitivity in ['high', 'medium', 'low']:
-            sensitivity = provided_sensitivity.capitalize()
-        else:
-            # Auto-detect based on issues
-            sensitivity = 'High' if any('PII' in issue for issue in issues) else 'Medium' if issues else 'Low'
-
-        # Save metadata
-        metadata = load_metadata()
-        metadata[filename] = {
-            'uploaded_at': datetime.now().isoformat(),
-            'sensitivity': sensitivity,
-            'status': 'Scanned',
-            'acl_tags': ['public'] if sensitivity == 'Low' else ['restricted'],
-            'issues': issues,
-            'size': file_path.stat().st_size
-        }
-        save_metadata(metadata)
+        update_document_metadata(
+            filename,
+            uploaded_at=datetime.now().isoformat(),
+            status='Uploaded',
+            size=file_path.stat().st_size,
+            requested_sensitivity=request.form.get('sensitivity')  # Reused if the job is resumed after a restart
+        )
 
-        # Auto-refresh vectorstore to include new document
-        try:
-            refresh_retriever()
-        except Exception:
-            pass  # Non-critical, will refresh on next query
+        # Extraction, scanning and indexing happen on the ingestion worker
+        job = submit_document(filename, request.form.get('sensitivity'))
 
         return jsonify({
-            'message': 'File uploaded successfully',
+            'message': 'File accepted for ingestion',
+            'job_id': job['id'],
             'document': {
                 'name': filename,
-                'sensitivity': sensitivity,
-                'status': 'Scanned',
-                'issues': issues,
-                'acl_tags': metadata[filename]['acl_tags']
+                'status': job['status']
             }
-        }), 201
+        }), 202
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -260,8 +126,7 @@ def get_document_details(filename):
         # Extract content preview
         content_preview = ""
         try:
-            text_content = extract_text_from_file(file_path)
-            content_preview = text_content[:500] + "..." if len(text_content) > 500 else text_content
+            content_preview = get_text_preview(file_path, 500)
         except Exception:
             content_preview = "[Unable to extract content preview]"
 
@@ -320,14 +185,12 @@ def delete_document(filename):
         if not file_path.exists():
             return jsonify({'error': 'File not found'}), 404
 
-        # Delete the file
+        # Delete the file and its extracted text
         file_path.unlink()
+        remove_extracted_text(filename)
 
         # Update metadata
-        metadata = load_metadata()
-        if filename in metadata:
-            del metadata[filename]
-            save_metadata(metadata)
+        remove_document_metadata(filename)
 
         # Auto-refresh vectorstore to remove deleted document
         try:
@@ -348,3 +211,11 @@ def refresh_documents():
         return jsonify({'message': 'RAG retriever refreshed successfully'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@documents_bp.route('/documents/jobs/<job_id>', methods=['GET'])
+def get_ingestion_job(job_id):
+    """Get the status and progress of an ingestion job"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job': job}), 200
@@ -1,14 +1,44 @@
-from flask import Flask, request, jsonify, Response
+import os
+
+# Optional gevent serving: idle /stream subscribers then cost a greenlet, not a
+# thread. Must patch before anything else imports threading/socket.
+USE_GEVENT = os.environ.get("ZEROSEC_GEVENT") == "1"
+if USE_GEVENT:
+    from gevent import monkey
+    monkey.patch_all()
+
+import json
+import time
+from itertools import chain
+
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 
-from backend.services.rag_service import query_rag
+from backend.services.rag_service import (
+    query_rag,
+    stream_query_rag,
+    refresh_retriever,
+    get_answer_cache_stats,
+    get_admission_stats,
+    get_inflight_stats,
+)
+from backend.services.admission import OverloadedError, StageTimeoutError
+from backend.services.metrics import record_query, render_metrics
+from backend.rag.retriever import get_cache_stats, get_ingestion_stats
+from backend.security import firewall
 from backend.services.logging_service import (
     stream_logs,
     get_logs,
+    tail_logs,
+    get_log_segments,
+    get_log_stats,
     log_decision,
     start_log_poller,
+    get_log_writer_stats,
+    get_stream_stats,
 )
 from backend.api.documents import documents_bp
+from backend.services.ingestion_service import resume_interrupted_jobs
 from backend.api.canary import canary_bp
 
 app = Flask("zerosec_api")
@@ -18,24 +48,171 @@ CORS(app, expose_headers=['X-Canary-ID', 'X-Output-Path', 'X-Canary-Hash', 'X-Ca
 app.register_blueprint(documents_bp)
 app.register_blueprint(canary_bp)
 
+def _rejected(question, error):
+    """429/503 response (with Retry-After) for a request turned away under load."""
+    if isinstance(error, OverloadedError):
+        result = {"decision": "BLOCK", "reason": error.reason, "stopped_by": "admission", "sources": []}
+        status, retry_after = error.status, error.retry_after
+    else:
+        result = {"decision": "BLOCK", "reason": f"{error.stage}_timeout", "stopped_by": "timeout", "sources": []}
+        status, retry_after = 503, 1
+    log_decision(question, result)
+    record_query(request.path, result)
+
+    response = jsonify(result)
+    response.status_code = status
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
 @app.route("/query", methods=["POST"])
 def query_route():
     data = request.get_json(force=True)
     question = data.get("question", "")
 
-    result = query_rag(question)
-    log_decision(question, result)
+    started = time.perf_counter()
+    try:
+        result = query_rag(question)
+    except (OverloadedError, StageTimeoutError) as e:
+        return _rejected(question, e)
+    log_decision(question, result, latency_ms=(time.perf_counter() - started) * 1000)
+    record_query("/query", result)
 
     return jsonify(result)
 
+@app.route("/query/stream", methods=["POST"])
+def query_stream_route():
+    """
+    Same as /query, but streams the answer as server-sent events:
+    'token' events carry sanitized answer text as it is generated, and a final
+    'done' event carries the full /query result.
+    """
+    data = request.get_json(force=True)
+    question = data.get("question", "")
+
+    # Run up to the first event here, so rejections still get a proper status code
+    started = time.perf_counter()
+    stream = stream_query_rag(question)
+    try:
+        first = next(stream)
+    except (OverloadedError, StageTimeoutError) as e:
+        return _rejected(question, e)
+
+    def events():
+        for event, payload in chain([first], stream):
+            if event == "done":
+                log_decision(question, payload, latency_ms=(time.perf_counter() - started) * 1000)
+                record_query("/query/stream", payload)
+                payload = json.dumps(payload)
+            else:
+                payload = json.dumps({"text": payload})
+            yield f"event: {event}\ndata: {payload}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus text-format metrics: stage latencies, query counts and component stats."""
+    body = render_metrics({
+        "firewall": firewall.get_stats(),
+        "retriever": get_cache_stats(),
+        "ingestion": get_ingestion_stats(),
+        "answer_cache": get_answer_cache_stats(),
+        "admission": get_admission_stats(),
+        "singleflight": get_inflight_stats(),
+        "detection_log": get_log_writer_stats(),
+        "stream": get_stream_stats(),
+    })
+    return Response(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route("/health/ready")
+def health_ready():
+    """Which firewall models are loaded; 503 until all of them have finished loading."""
+    status = firewall.get_model_status()
+    return jsonify(status), 200 if status["ready"] else 503
+
 @app.route("/logs")
 def logs():
-    return jsonify(get_logs())
+    """
+    Logged decisions, newest first, one page at a time.
+    Filters: since/until (ISO timestamps; startDate/endDate accepted too),
+    decision, stopped_by. Paging: limit, and cursor = next_cursor of the previous page.
+    aggregates=1 adds counts over all matching rows (first page only; it scans the range).
+    For dashboard charts prefer /logs/stats, which is pre-aggregated.
+    """
+    args = request.args
+    until = args.get("until") or args.get("endDate")
+    if until and len(until) == 10:  # A bare date includes the whole day
+        until += "T23:59:59.999999Z"
+    decision = args.get("decision")
+    try:
+        result = get_logs(
+            since=args.get("since") or args.get("startDate"),
+            until=until,
+            decision=decision.upper() if decision and decision != "all" else None,
+            stopped_by=args.get("stopped_by"),
+            limit=int(args.get("limit", 100)),
+            cursor=int(args["cursor"]) if args.get("cursor") else None,
+            aggregates=args.get("aggregates") in ("1", "true"),
+        )
+    except ValueError:
+        return jsonify({"error": "limit and cursor must be integers"}), 400
+    return jsonify(result)
+
+@app.route("/logs/tail")
+def logs_tail():
+    """The last n decisions (default 100), newest first, without touching older history."""
+    try:
+        n = int(request.args.get("n", 100))
+    except ValueError:
+        return jsonify({"error": "n must be an integer"}), 400
+    return jsonify({"logs": tail_logs(n)})
+
+@app.route("/logs/segments")
+def logs_segments():
+    """Rotated log segments, oldest first, with the time range each one covers."""
+    return jsonify({"segments": get_log_segments()})
+
+@app.route("/logs/stats")
+def logs_stats():
+    """
+    Dashboard analytics from pre-aggregated rollups: counts by decision, reason,
+    stopped_by and attack type, block rate and latency percentiles.
+    Params: resolution (minute|hour), since/until (ISO timestamps).
+    """
+    args = request.args
+    try:
+        return jsonify(get_log_stats(
+            resolution=args.get("resolution", "minute"),
+            since=args.get("since") or args.get("startDate"),
+            until=args.get("until") or args.get("endDate"),
+        ))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
 @app.route("/stream")
 def stream():
-    return Response(stream_logs(), content_type="text/event-stream")
+    # EventSource sends Last-Event-ID on reconnect; the query arg allows resuming by hand
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("lastEventId")
+    return Response(
+        stream_logs(last_event_id),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 if __name__ == "__main__":
     start_log_poller()
-    app.run(host="0.0.0.0", port=5200, debug=False)
+    # Pattern checks work immediately; the PII model loads in the background
+    firewall.start_model_warmup()
+    # Uploads interrupted by the last shutdown are scanned and indexed again
+    resume_interrupted_jobs()
+    # Load the persisted vectorstore and embed only what changed while we were down
+    refresh_retriever()
+    if USE_GEVENT:
+        from gevent.pywsgi import WSGIServer
+        WSGIServer(("0.0.0.0", 5200), app).serve_forever()
+    else:
+        app.run(host="0.0.0.0", port=5200, debug=False, threaded=True)
@@ -0,0 +1,151 @@
+"""
+Content-addressed embedding cache.
+- Vectors are stored in SQLite keyed by (model, sha256(text))
+- Unchanged or duplicated chunks are embedded once, across rebuilds and restarts
+- Size-bounded with least-recently-used eviction
+- Wraps any LangChain Embeddings, so Chroma uses it for both ingestion and queries
+"""
+
+import sqlite3
+import threading
+import time
+from array import array
+from hashlib import sha256
+from pathlib import Path
+
+from langchain_core.embeddings import Embeddings
+
+SQLITE_MAX_PARAMS = 500  # Keep IN (...) lists well under SQLite's variable limit
+
+
+def _text_hash(text: str) -> str:
+    return sha256(text.encode("utf-8")).hexdigest()
+
+
+def _to_blob(vector) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _from_blob(blob: bytes) -> list:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that consults a disk cache before calling the model."""
+
+    def __init__(self, embeddings: Embeddings, model_name: str, db_path: Path, max_entries: int = 200_000):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.query_model_name = f"{model_name}#query"  # Query vectors may differ from document vectors
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    # -------------------------
+    # CACHE STORAGE
+    # -------------------------
+    def _lookup(self, model: str, hashes: list) -> dict:
+        """Return {text_hash: vector} for the hashes present in the cache."""
+        found = {}
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(hashes), SQLITE_MAX_PARAMS):
+                batch = hashes[i:i + SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch]
+                ).fetchall()
+                found.update((h, _from_blob(blob)) for h, blob in rows)
+                self._conn.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash IN ({placeholders})",
+                    [now, model, *batch]
+                )
+            self._conn.commit()
+        return found
+
+    def _store(self, model: str, items: dict):
+        """Insert {text_hash: vector} and evict least-recently-used rows past max_entries."""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(model, h, _to_blob(v), now) for h, v in items.items()]
+            )
+            self._entries += cursor.rowcount
+            excess = self._entries - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,)
+                )
+                self._entries -= excess
+                self.stats["evictions"] += excess
+            self._conn.commit()
+
+    # -------------------------
+    # EMBEDDINGS API
+    # -------------------------
+    def embed_documents(self, texts: list) -> list:
+        hashes = [_text_hash(t) for t in texts]
+        cached = self._lookup(self.model_name, list(set(hashes)))
+
+        # Embed each distinct missing text once, even if repeated in the batch
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in cached and h not in missing:
+                missing[h] = text
+
+        self.stats["hits"] += len(texts) - len(missing)
+        self.stats["misses"] += len(missing)
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self._store(self.model_name, fresh)
+            cached.update(fresh)
+
+        return [cached[h] for h in hashes]
+
+    def embed_query(self, text: str) -> list:
+        h = _text_hash(text)
+        cached = self._lookup(self.query_model_name, [h])
+        if h in cached:
+            self.stats["hits"] += 1
+            return cached[h]
+
+        self.stats["misses"] += 1
+        vector = self.embeddings.embed_query(text)
+        self._store(self.query_model_name, {h: vector})
+        return vector
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": self._entries,
+            "max_entries": self.max_entries,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,120 @@
+"""
+In-process BM25 inverted index over indexed chunks.
+- Maintained alongside the vector index (same chunk ids, same generations)
+- Matches exact identifiers, names and codes that embeddings tend to miss
+- Answers queries without any embedding call
+Only term statistics are kept here; chunk text stays in the vectorstore.
+"""
+
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+# Identifiers like "CVE-2024-1234", "v1.2.3" or "user_id" stay whole tokens;
+# their parts are indexed as well so partial lookups still match.
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./:]\w+)*")
+TOKEN_PART_SPLIT = re.compile(r"[-./:]")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "he",
+    "in", "is", "it", "its", "of", "on", "or", "that", "the", "to", "was", "were",
+    "will", "with", "what", "who", "how", "which", "this", "these", "those",
+}
+
+
+def tokenize(text: str) -> list:
+    """Lowercase word/identifier tokens, without stopwords."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token not in STOPWORDS:
+            tokens.append(token)
+        if TOKEN_PART_SPLIT.search(token):
+            tokens.extend(p for p in TOKEN_PART_SPLIT.split(token) if p and p not in STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    """Thread-safe BM25 index with incremental add/remove by chunk id."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = defaultdict(dict)  # term -> {chunk_id: term frequency}
+        self._chunks = {}  # chunk_id -> (length, generation, terms)
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def add(self, chunk_id: str, text: str, generation: int = 0):
+        """Index a chunk, replacing any previous entry with the same id."""
+        counts = Counter(tokenize(text))
+        with self._lock:
+            if chunk_id in self._chunks:
+                self._remove_locked(chunk_id)
+            for term, tf in counts.items():
+                self._postings[term][chunk_id] = tf
+            length = sum(counts.values())
+            self._chunks[chunk_id] = (length, generation, tuple(counts))
+            self._total_length += length
+
+    def remove(self, chunk_ids):
+        with self._lock:
+            for chunk_id in chunk_ids:
+                if chunk_id in self._chunks:
+                    self._remove_locked(chunk_id)
+
+    def _remove_locked(self, chunk_id):
+        length, _, terms = self._chunks.pop(chunk_id)
+        self._total_length -= length
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._chunks.clear()
+            self._total_length = 0
+
+    def search(self, query: str, k: int, max_generation: int = None, min_score: float = 0.0) -> list:
+        """
+        Score chunks against the query.
+        Returns up to k (chunk_id, score) pairs, best first, skipping chunks
+        newer than max_generation and scores below min_score.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            n_chunks = len(self._chunks)
+            if not n_chunks:
+                return []
+            avg_length = self._total_length / n_chunks
+            scores = defaultdict(float)
+
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (n_chunks - df + 0.5) / (df + 0.5))
+                for chunk_id, tf in postings.items():
+                    length, generation, _ = self._chunks[chunk_id]
+                    if max_generation is not None and generation > max_generation:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(
+            ((cid, score) for cid, score in scores.items() if score >= min_score),
+            key=lambda item: item[1],
+            reverse=True
+        )
+        return ranked[:k]
@@ -73,22 +73,30 @@ def build_safe_context(docs):
     used_sources = []
     seen_content = set()
 
+    # Skip near-duplicate content
+    unique = []
     for i, doc in enumerate(docs[:MAX_CHUNKS]):
+        text_hash = hash(doc.page_content[:100])
+        if text_hash not in seen_content:
+            seen_content.add(text_hash)
+            unique.append((i, doc))
+
+    # Security check - precomputed at index time unless the rules changed since;
+    # anything left is inspected live, as one batch
+    inspections = [firewall.inspection_from_metadata(doc.metadata, doc.page_content) for _, doc in unique]
+    pending = [n for n, info in enumerate(inspections) if info is None]
+    if pending:
+        live = firewall.inspect_documents([unique[n][1].page_content for n in pending])
+        for n, info in zip(pending, live):
+            inspections[n] = info
+
+    for (i, doc), info in zip(unique, inspections):
         filename = doc.metadata.get("filename", f"doc_{i}")
         chunk_idx = doc.metadata.get("chunk_index", 0)
         total_chunks = doc.metadata.get("total_chunks", 1)
         source_path = doc.metadata.get("source", "")
         file_type = doc.metadata.get("file_type", "")
-        text = doc.page_content
 
-        # Skip near-duplicate content
-        text_hash = hash(text[:100])
-        if text_hash in seen_content:
-            continue
-        seen_content.add(text_hash)
-
-        # Security check
-        info = firewall.inspect_document_text(text)
         if not info.get("include"):
             removed.append({
                 "filename": filename,
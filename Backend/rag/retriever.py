@@ -1,9 +1,25 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
 from pathlib import Path
 from hashlib import md5
 from langchain_chroma import Chroma
 from langchain_ollama import OllamaEmbeddings
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from backend.rag.embedding_cache import CachedEmbeddings
+from backend.rag.lexical_index import BM25Index
+from backend.utils.cache import LRUCache
+from backend.services.metrics import stage_timer, debug_enabled, debug_log
+from backend.security import firewall
+from backend.services.extraction_service import (
+    compute_content_hash,
+    extract_many,
+    iter_extracted_pages,
+)
 
 # -------------------------
 # CONFIG
@@ -11,31 +27,117 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 BASE_DIR = Path(__file__).resolve().parents[1]
 DOCS_PATH = BASE_DIR / "data" / "docs"
 PERSIST_DIR = BASE_DIR / "data" / "vectorstore"
+MANIFEST_PATH = PERSIST_DIR / "manifest.json"
+MANIFEST_VERSION = 4  # Bump when chunk ids/metadata change shape
 EMBEDDING_MODEL = "nomic-embed-text"  # Proper embedding model for semantic search
+COLLECTION_NAME = "zerosec_docs"
+
+# Embedding cache config
+EMBEDDING_CACHE_PATH = PERSIST_DIR / "embedding_cache.sqlite3"
+EMBEDDING_CACHE_MAX_ENTRIES = 200_000  # ~600 MB of 768-dim float32 vectors at the limit
+
+# Ingestion config - tune to what the local embedding server can absorb
+EMBED_BATCH_SIZE = 32  # Chunks per embedding request
+EMBED_WORKERS = 4  # Concurrent embedding requests
+EMBED_MAX_PENDING = EMBED_WORKERS * 2  # Batches in flight before ingestion waits (back-pressure)
+EMBED_MAX_RETRIES = 3  # Retries per batch on embedding errors
+EMBED_RETRY_BACKOFF = 1.0  # Seconds before first retry, doubled each attempt
 
 # Chunking config
 CHUNK_SIZE = 1000  # Larger chunks = fewer chunks, more context per chunk
 CHUNK_OVERLAP = 100  # Overlap to maintain context between chunks
+STREAM_WINDOW = CHUNK_SIZE * 8  # Buffered characters before streamed pages are split
 
 # Retriever config
 TOP_K = 6  # Max chunks to consider initially (before filtering)
 DISTANCE_THRESHOLD = 1.0  # Maximum distance to include (lower = more similar, nomic-embed uses ~0.5-1.5 range)
 MAX_RESULTS = 3  # Maximum results to return after filtering
 
+# Retrieval mode: "vector" (embeddings only), "lexical" (BM25 only, no embedding
+# call) or "hybrid" (both, fused with reciprocal rank fusion)
+RETRIEVAL_MODE = "hybrid"
+LEXICAL_MIN_SCORE = 1.0  # Minimum BM25 score; drops matches on common words only
+RRF_K = 60  # Reciprocal rank fusion constant (higher = flatter rank weighting)
+LEXICAL_LOAD_BATCH = 1000  # Chunks read per batch when rebuilding BM25 at startup
+
+# Query-time caches
+QUERY_EMBEDDING_CACHE_SIZE = 2048  # Normalized query -> embedding
+RESULTS_CACHE_SIZE = 1024  # (normalized query, generation, mode) -> results
+
 # Global cache
 _vectorstore_cache = None
 _last_file_hash = None
 _embeddings_cache = None
 
+# BM25 index over the same chunks as the vectorstore; in memory, rebuilt from
+# the persisted collection's stored text at startup (no embedding needed)
+_lexical_index = BM25Index()
+
+# Query caches. Results are keyed by index generation, so any ingestion that
+# publishes a new generation makes older entries unreachable.
+_query_embedding_cache = LRUCache(QUERY_EMBEDDING_CACHE_SIZE)
+_results_cache = LRUCache(RESULTS_CACHE_SIZE)
+
+# Per-file index manifest: filename -> {"size", "mtime", "hash", "chunk_ids"}
+# Lets a sync touch only the files that were added, changed or deleted.
+# Persisted next to the collection so restarts only embed the delta.
+_manifest = {}
+_index_lock = threading.Lock()
+_background_sync = None
+
+# Index generation: bumped each time a sync publishes changes. Chunks carry the
+# generation that wrote them and queries only see chunks <= the published one,
+# so a sync in progress never exposes a half-indexed file.
+_index_generation = 0
+
+# Chunk ids whose deletion failed (e.g. the collection was unavailable); retried on the next sync
+_pending_deletes = []
+
+# Chunk id -> generation from which it is retired. Replaced and deleted chunks
+# stay in the collection until vectorstore.delete succeeds; queries at or past
+# that generation skip them, so they never show up next to their replacements.
+_retired = {}
+
+# Cumulative ingestion counters
+_ingest_stats = {"chunks": 0, "batches": 0, "retries": 0, "seconds": 0.0}
+_ingest_stats_lock = threading.Lock()  # Retries are counted from embedding pool threads
+
 
 def _get_embeddings():
-    """Get cached embeddings instance."""
+    """Get cached embeddings instance (disk cache in front of Ollama)."""
     global _embeddings_cache
     if _embeddings_cache is None:
-        _embeddings_cache = OllamaEmbeddings(model=EMBEDDING_MODEL)
+        _embeddings_cache = CachedEmbeddings(
+            OllamaEmbeddings(model=EMBEDDING_MODEL),
+            model_name=EMBEDDING_MODEL,
+            db_path=EMBEDDING_CACHE_PATH,
+            max_entries=EMBEDDING_CACHE_MAX_ENTRIES
+        )
     return _embeddings_cache
 
 
+def get_ingestion_stats() -> dict:
+    """Get cumulative embedding throughput for ingestion."""
+    with _ingest_stats_lock:
+        stats = dict(_ingest_stats)
+    seconds = stats["seconds"]
+    return {
+        **stats,
+        "seconds": round(seconds, 3),
+        "chunks_per_sec": round(stats["chunks"] / seconds, 1) if seconds else 0.0,
+    }
+
+
+def get_cache_stats() -> dict:
+    """Get retriever cache statistics."""
+    return {
+        "embedding_cache": _get_embeddings().get_stats(),
+        "lexical_index_chunks": len(_lexical_index),
+        "query_embedding_cache": _query_embedding_cache.get_stats(),
+        "results_cache": _results_cache.get_stats(),
+    }
+
+
 def _compute_files_hash():
     """Compute hash of all files (names + sizes + mtimes) for cache invalidation."""
     hash_parts = []
@@ -46,50 +148,8 @@ def _compute_files_hash():
     return md5("|".join(hash_parts).encode()).hexdigest()
 
 
-def extract_text_from_file(file_path):
-    """Extract text from various file formats."""
-    ext = file_path.suffix.lower()
-
-    try:
-        if ext in ['.txt', '.md', '.log', '.csv', '.json', '.xml', '.html', '.htm']:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read()
-
-        elif ext == '.pdf':
-            try:
-                import PyPDF2
-                with open(file_path, 'rb') as f:
-                    reader = PyPDF2.PdfReader(f)
-                    return '\n'.join(page.extract_text() or '' for page in reader.pages)
-            except Exception:
-                return ""
-
-        elif ext == '.docx':
-            try:
-                import docx
-                doc = docx.Document(file_path)
-                return '\n'.join(p.text for p in doc.paragraphs)
-            except Exception:
-                return ""
-
-        elif ext == '.doc':
-            try:
-                import pypandoc
-                return pypandoc.convert_file(str(file_path), 'plain')
-            except Exception:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    return f.read()
-        else:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read()
-
-    except Exception:
-        return ""
-
-
-def _chunk_documents(documents):
-    """Split documents into optimized chunks for retrieval."""
-    splitter = RecursiveCharacterTextSplitter(
+def _get_splitter():
+    return RecursiveCharacterTextSplitter(
         chunk_size=CHUNK_SIZE,
         chunk_overlap=CHUNK_OVERLAP,
         length_function=len,
@@ -97,6 +157,11 @@ def _chunk_documents(documents):
         keep_separator=True
     )
 
+
+def _chunk_documents(documents):
+    """Split documents into optimized chunks for retrieval."""
+    splitter = _get_splitter()
+
     chunked_docs = []
     for doc in documents:
         chunks = splitter.split_text(doc.page_content)
@@ -114,12 +179,16 @@ def _chunk_documents(documents):
 
 
 def load_all_documents():
-    """Load all documents from docs directory."""
+    """Load all documents from docs directory (extracted in parallel)."""
     documents = []
 
-    for file_path in DOCS_PATH.glob('*.*'):
-        if file_path.is_file():
-            text = extract_text_from_file(file_path)
+    file_paths = [f for f in DOCS_PATH.glob('*.*') if f.is_file()]
+    stored_paths = extract_many(file_paths)
+
+    for file_path in file_paths:
+        if stored_paths.get(file_path):
+            with open(stored_paths[file_path], 'r', encoding='utf-8') as f:
+                text = f.read()
             if text and text.strip():
                 documents.append(Document(
                     page_content=text,
@@ -132,68 +201,482 @@ def load_all_documents():
     return documents
 
 
-def _ensure_vectorstore(force_reload=False):
+def _load_manifest():
     """
-    Ensure vectorstore is built and cached.
-    Returns the vectorstore instance.
+    Load the persisted manifest.
+    Returns (files, generation); ({}, 0) if missing, unreadable or stale.
     """
-    global _vectorstore_cache, _last_file_hash
-
-    current_hash = _compute_files_hash()
+    if not MANIFEST_PATH.exists():
+        return {}, 0
+    try:
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[RAG] Ignoring unreadable manifest {MANIFEST_PATH}: {e}")
+        return {}, 0
+    if data.get("version") != MANIFEST_VERSION or data.get("embedding_model") != EMBEDDING_MODEL:
+        return {}, 0
+    return data.get("files", {}), data.get("generation", 0)
+
+
+def _save_manifest():
+    """Atomically write the manifest next to the persisted collection."""
+    PERSIST_DIR.mkdir(parents=True, exist_ok=True)
+    data = {
+        "version": MANIFEST_VERSION,
+        "embedding_model": EMBEDDING_MODEL,
+        "generation": _index_generation,
+        "files": _manifest,
+    }
+    tmp_path = MANIFEST_PATH.with_suffix(".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def _open_vectorstore():
+    """
+    Open the persisted collection and reconcile it with the saved manifest.
+    Files whose chunks are missing from the collection are dropped from the
+    manifest (so they get re-embedded); chunks no manifest entry owns are deleted.
+    """
+    global _manifest, _index_generation
 
-    # Check if we need to rebuild
-    needs_rebuild = (
-        force_reload or
-        _vectorstore_cache is None or
-        current_hash != _last_file_hash
+    vectorstore = Chroma(
+        collection_name=COLLECTION_NAME,
+        embedding_function=_get_embeddings(),
+        persist_directory=str(PERSIST_DIR)
     )
 
-    if needs_rebuild:
-        # Load and chunk documents
-        documents = load_all_documents()
+    manifest, generation = _load_manifest()
+    stored_ids = set(vectorstore.get(include=[])["ids"])
+
+    if not manifest and stored_ids:
+        # Collection built by another manifest version or embedding model
+        print(f"[RAG] Discarding {len(stored_ids)} persisted chunks without a valid manifest")
+        vectorstore.reset_collection()
+        stored_ids = set()
+    _lexical_index.clear()
+
+    for filename in list(manifest):
+        if not stored_ids.issuperset(manifest[filename]["chunk_ids"]):
+            del manifest[filename]
+
+    owned_ids = {cid for entry in manifest.values() for cid in entry["chunk_ids"]}
+    orphan_ids = list(stored_ids - owned_ids)
+    if orphan_ids:
+        vectorstore.delete(ids=orphan_ids)
+
+    _load_lexical_index(vectorstore, len(owned_ids))
+
+    _manifest = manifest
+    _index_generation = generation
+    print(f"[RAG] Loaded persisted vectorstore: {len(manifest)} files, {len(owned_ids)} chunks "
+          f"(generation {generation})")
+    return vectorstore
 
-        if not documents:
-            # Create minimal in-memory vectorstore for empty state
-            _vectorstore_cache = Chroma.from_texts(
-                texts=["No documents available"],
-                embedding=_get_embeddings()
+
+def _load_lexical_index(vectorstore, total):
+    """Rebuild the BM25 index from text already stored in the collection."""
+    for offset in range(0, total, LEXICAL_LOAD_BATCH):
+        batch = vectorstore.get(include=["documents", "metadatas"], limit=LEXICAL_LOAD_BATCH, offset=offset)
+        for chunk_id, text, metadata in zip(batch["ids"], batch["documents"], batch["metadatas"]):
+            _lexical_index.add(chunk_id, text, (metadata or {}).get("index_generation", 0))
+
+
+def _iter_file_chunks(file_path, content_hash, generation):
+    """
+    Stream (chunk, chunk_id) pairs for a file, reading its stored text a page
+    at a time. Pages accumulate in a window of about STREAM_WINDOW characters;
+    each split emits every chunk but the last, which is carried into the next
+    window so overlap is preserved across page boundaries.
+    Chunk metadata records the page range the chunk came from and the
+    firewall inspection of the chunk, so queries don't re-inspect it.
+    Ids embed the content hash and firewall rules version so a changed file
+    (or re-inspected chunk) never collides with the chunks it replaces.
+    """
+    splitter = _get_splitter()
+    base_metadata = {
+        'source': str(file_path),
+        'filename': file_path.name,
+        'file_type': file_path.suffix,
+        'index_generation': generation,
+    }
+    buffer = ""
+    page_starts = []  # (offset in buffer, page number), ascending
+    chunk_index = 0
+
+    def page_at(offset):
+        page = page_starts[0][1]
+        for start, number in page_starts:
+            if start > offset:
+                break
+            page = number
+        return page
+
+    def split(final):
+        nonlocal buffer, page_starts, chunk_index
+        chunks = [c for c in splitter.split_text(buffer) if c.strip()]
+        cursor = 0
+        offsets = []
+        for chunk in chunks:
+            start = buffer.find(chunk, cursor)
+            start = cursor if start < 0 else start
+            offsets.append(start)
+            cursor = start + 1
+
+        emit = chunks if final else chunks[:-1]
+        inspections = firewall.inspection_metadata(emit)
+        for chunk, start, inspection in zip(emit, offsets, inspections):
+            document = Document(
+                page_content=chunk,
+                metadata={
+                    **base_metadata,
+                    **inspection,
+                    "chunk_index": chunk_index,
+                    "page": page_at(start),
+                    "page_end": page_at(start + len(chunk) - 1),
+                }
             )
+            yield document, f"{file_path.name}::{content_hash[:16]}::{firewall.RULES_VERSION}::{chunk_index}"
+            chunk_index += 1
+
+        if not final and chunks:
+            # Restart the window at the carried chunk
+            cut = offsets[-1]
+            first_page = page_at(cut)
+            buffer = buffer[cut:]
+            page_starts = [(0, first_page)] + [
+                (start - cut, number) for start, number in page_starts if start > cut
+            ]
+
+    for page_number, page_text in iter_extracted_pages(file_path, content_hash):
+        if buffer:
+            buffer += "\n"
+        page_starts.append((len(buffer), page_number))
+        buffer += page_text
+        if len(buffer) >= STREAM_WINDOW:
+            yield from split(final=False)
+
+    if buffer.strip():
+        yield from split(final=True)
+
+
+def _embed_batch(texts):
+    """Embed one batch, retrying failures with exponential backoff."""
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        try:
+            return _get_embeddings().embed_documents(texts)
+        except Exception as e:
+            if attempt == EMBED_MAX_RETRIES:
+                raise
+            delay = EMBED_RETRY_BACKOFF * (2 ** attempt)
+            with _ingest_stats_lock:
+                _ingest_stats["retries"] += 1
+            print(f"[RAG] Embedding batch of {len(texts)} failed ({e}); retry {attempt + 1} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _add_chunks(vectorstore, chunk_pairs, label=""):
+    """
+    Embed (chunk, chunk_id) pairs in batches on a bounded worker pool and upsert them.
+    Pairs are pulled lazily, and at most EMBED_MAX_PENDING batches are in flight,
+    so a streamed file is never fully materialized. Finished batches are
+    written to the collection from this thread as they complete.
+    If any batch ultimately fails, chunks already written are removed again.
+    Returns the ids written.
+    """
+    started = time.perf_counter()
+    pairs = iter(chunk_pairs)
+    written_ids = []
+    pending = set()
+
+    def write(future):
+        batch, vectors = future.result()
+        ids = [cid for _, cid in batch]
+        vectorstore._collection.upsert(
+            ids=ids,
+            embeddings=vectors,
+            documents=[doc.page_content for doc, _ in batch],
+            metadatas=[doc.metadata for doc, _ in batch]
+        )
+        for doc, cid in batch:
+            _lexical_index.add(cid, doc.page_content, doc.metadata.get("index_generation", 0))
+        written_ids.extend(ids)
+
+    try:
+        with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as pool:
+            while True:
+                batch = list(islice(pairs, EMBED_BATCH_SIZE))
+                if batch:
+                    texts = [doc.page_content for doc, _ in batch]
+                    pending.add(pool.submit(lambda b=batch, t=texts: (b, _embed_batch(t))))
+                    with _ingest_stats_lock:
+                        _ingest_stats["batches"] += 1
+
+                # Back-pressure: drain until there is room (or everything once input ends)
+                while pending and (len(pending) >= EMBED_MAX_PENDING or not batch):
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        write(future)
+
+                if not batch:
+                    break
+    except Exception:
+        for future in pending:
+            future.cancel()
+        if written_ids:
+            vectorstore.delete(ids=written_ids)
+            _lexical_index.remove(written_ids)
+        raise
+
+    elapsed = time.perf_counter() - started
+    with _ingest_stats_lock:
+        _ingest_stats["chunks"] += len(written_ids)
+        _ingest_stats["seconds"] += elapsed
+    if written_ids:
+        rate = len(written_ids) / elapsed if elapsed else 0.0
+        print(f"[RAG] Embedded {len(written_ids)} chunks{label} in {elapsed:.2f}s ({rate:.1f} chunks/s)")
+    return written_ids
+
+
+def get_index_generation() -> int:
+    """Get the currently published index generation."""
+    return _index_generation
+
+
+def _generation_filter(generation=None):
+    """Chroma filter restricting results to the published (or given) index generation."""
+    return {"index_generation": {"$lte": _index_generation if generation is None else generation}}
+
+
+def _is_retired(chunk_id, generation):
+    """True if a chunk was replaced or deleted as of generation (but not yet removed)."""
+    retired_at = _retired.get(chunk_id)
+    return retired_at is not None and retired_at <= generation
+
+
+def _sync_vectorstore(vectorstore):
+    """
+    Bring the vectorstore in line with DOCS_PATH using the per-file manifest.
+    Only added/changed files are chunked and embedded, only deleted/changed
+    files have their old chunks removed; unchanged files keep their vectors.
+    Files inspected under older firewall rules are re-chunked (their vectors
+    come from the embedding cache) so stored inspections stay current.
+    New chunks are written under the next generation and the chunks they
+    replace are retired from it, so queries see either version, never a mix;
+    retired chunks are deleted after it is published (or on a later sync).
+    If a file fails part-way, everything finished before it (removals included)
+    is still published and cleaned up; the failed file keeps its old chunks and
+    is retried on the next sync.
+    """
+    global _index_generation, _pending_deletes
+
+    files = {f.name: f for f in sorted(DOCS_PATH.glob('*.*')) if f.is_file()}
+    next_generation = _index_generation + 1
+    stale_ids = []
+    counts = {"added": 0, "updated": 0, "removed": 0, "touched": 0}
+
+    # Files that disappeared from disk
+    for filename in [name for name in _manifest if name not in files]:
+        entry = _manifest.pop(filename)
+        stale_ids.extend(entry["chunk_ids"])
+        counts["removed"] += 1
+
+    try:
+        _sync_changed_files(vectorstore, files, next_generation, stale_ids, counts)
+    finally:
+        added, updated, removed, touched = counts["added"], counts["updated"], counts["removed"], counts["touched"]
+        # A file changed back to earlier content reuses its chunk ids: never delete live chunks
+        live_ids = {cid for entry in _manifest.values() for cid in entry["chunk_ids"]}
+        stale_ids = [cid for cid in _pending_deletes + stale_ids if cid not in live_ids]
+        for cid in live_ids.intersection(_retired):
+            del _retired[cid]
+        for cid in stale_ids:
+            _retired.setdefault(cid, next_generation)
+
+        if added or updated or removed:
+            # Publish the new generation, then drop the chunks it replaced
+            _index_generation = next_generation
+
+        if stale_ids:
+            _lexical_index.remove(stale_ids)
+            try:
+                vectorstore.delete(ids=stale_ids)
+                _pending_deletes = []
+                for cid in stale_ids:
+                    _retired.pop(cid, None)
+            except Exception as e:
+                _pending_deletes = stale_ids
+                print(f"[RAG] Failed to delete {len(stale_ids)} stale chunks, will retry: {e}")
         else:
-            # Chunk documents for better retrieval
-            chunked_docs = _chunk_documents(documents)
+            _pending_deletes = []
 
-            # Create in-memory vectorstore (simpler, avoids file locking issues)
-            _vectorstore_cache = Chroma.from_documents(
-                documents=chunked_docs,
-                embedding=_get_embeddings()
-            )
+        if added or updated or removed or touched:
+            _save_manifest()
 
-        _last_file_hash = current_hash
+    if added or updated or removed:
+        print(f"[RAG] Index sync: {added} added, {updated} updated, {removed} removed "
+              f"({len(_manifest)} files indexed)")
 
-    return _vectorstore_cache
 
+def _sync_changed_files(vectorstore, files, next_generation, stale_ids, counts):
+    """
+    Index added/changed files under next_generation, updating the manifest and
+    counts file by file, so a failure part-way leaves both describing exactly
+    the files that finished. Chunks replaced by a finished file go to stale_ids.
+    """
+    changed = []
+    for filename, file_path in files.items():
+        stat = file_path.stat()
+        entry = _manifest.get(filename)
+
+        current_rules = entry is not None and entry.get("fw_version") == firewall.RULES_VERSION
+
+        # Cheap check first: same size and mtime means same file
+        if current_rules and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            continue
+
+        content_hash = compute_content_hash(file_path)
+        if current_rules and entry["hash"] == content_hash:
+            # Touched but not modified - keep existing vectors
+            entry.update(size=stat.st_size, mtime=stat.st_mtime)
+            counts["touched"] += 1
+            continue
+
+        changed.append((filename, file_path, stat, content_hash, entry))
+
+    # Extract every changed file up front, in parallel across processes
+    stored_paths = extract_many(
+        [file_path for _, file_path, _, _, _ in changed],
+        content_hashes={file_path: content_hash for _, file_path, _, content_hash, _ in changed}
+    )
 
-def retrieve_with_scores(query: str, force_reload=False):
+    for filename, file_path, stat, content_hash, entry in changed:
+        if stored_paths.get(file_path) is None:
+            # Extraction failed or timed out: keep the old entry and chunks, so the
+            # file still looks changed and is retried on the next sync
+            print(f"[RAG] Not indexing {filename} (extraction failed); will retry on the next sync")
+            continue
+        chunk_ids = _add_chunks(
+            vectorstore,
+            _iter_file_chunks(file_path, content_hash, next_generation),
+            label=f" from {filename}"
+        )
+        if entry:
+            stale_ids.extend(entry["chunk_ids"])
+
+        _manifest[filename] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "hash": content_hash,
+            "fw_version": firewall.RULES_VERSION,
+            "chunk_ids": chunk_ids,
+        }
+        counts["updated" if entry else "added"] += 1
+
+
+def sync_index(force=False):
     """
-    Retrieve documents with relevance scores and filter by threshold.
-    Only returns documents that are actually relevant to the query.
+    Synchronously bring the index up to date with the docs directory.
+    force re-checks every file even if the directory hash is unchanged.
+    Returns the vectorstore instance.
+    """
+    global _vectorstore_cache, _last_file_hash
 
-    Returns: List of (Document, score) tuples where score is normalized 0-1 (higher = more relevant)
+    with _index_lock:
+        current_hash = _compute_files_hash()
+
+        # Check if we need to sync
+        needs_sync = (
+            force or
+            _vectorstore_cache is None or
+            current_hash != _last_file_hash
+        )
+
+        if needs_sync:
+            if _vectorstore_cache is None:
+                # Persisted collection, updated incrementally per file
+                _vectorstore_cache = _open_vectorstore()
+
+            _sync_vectorstore(_vectorstore_cache)
+            _last_file_hash = current_hash
+
+        return _vectorstore_cache
+
+
+def _start_background_sync():
+    """Sync the index on a background thread unless one is already running."""
+    global _background_sync
+    if _background_sync is not None and _background_sync.is_alive():
+        return
+    _background_sync = threading.Thread(target=sync_index, name="index-sync", daemon=True)
+    _background_sync.start()
+
+
+def _ensure_vectorstore(force_reload=False):
     """
-    vectorstore = _ensure_vectorstore(force_reload)
+    Ensure vectorstore is built and cached.
+    Only the first load (or force_reload) syncs inline; later changes on disk
+    are picked up by a background sync while queries keep being served from
+    the published generation.
+    Returns the vectorstore instance.
+    """
+    if force_reload or _vectorstore_cache is None:
+        return sync_index(force=force_reload)
+
+    if _compute_files_hash() != _last_file_hash:
+        _start_background_sync()
+
+    return _vectorstore_cache
+
+
+def _set_total_chunks(doc):
+    """Chunks are streamed, so the per-file chunk count comes from the manifest."""
+    entry = _manifest.get(doc.metadata.get('filename'))
+    if entry:
+        doc.metadata["total_chunks"] = len(entry["chunk_ids"])
+    return doc
+
+
+def _normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive cache key for a query."""
+    return ' '.join(query.lower().split())
+
+
+def embed_query(query: str):
+    """Embed a query, reusing the embedding of any equivalent earlier query."""
+    key = (EMBEDDING_MODEL, _normalize_query(query))
+    with stage_timer("embed"):
+        embedding = _query_embedding_cache.get(key)
+        if embedding is None:
+            embedding = _get_embeddings().embed_query(query)
+            _query_embedding_cache.put(key, embedding)
+    return embedding
 
-    # Get documents with distance scores (lower distance = more similar)
-    # Using similarity_search_with_score which returns raw distances
-    results = vectorstore.similarity_search_with_score(
-        query,
-        k=TOP_K
-    )
 
-    # Debug: Print distances and content previews
-    print(f"[RAG] Query: '{query[:50]}...' - Distances: {[round(d, 3) for _, d in results]}")
-    for i, (doc, dist) in enumerate(results):
-        content_preview = doc.page_content[:100].replace('\n', ' ')
-        print(f"[RAG]   {i+1}. [{doc.metadata.get('filename', 'unknown')}] dist={dist:.3f} content: {content_preview}...")
+def _vector_search(vectorstore, query):
+    """Embedding search; returns [(Document, distance)] within DISTANCE_THRESHOLD."""
+    # Get documents with distance scores (lower distance = more similar)
+    # Using similarity_search_by_vector_with_relevance_scores which returns raw distances
+    query_embedding = embed_query(query)
+    generation = _index_generation
+    retired = len(_retired)
+    with stage_timer("vector_search"):
+        results = vectorstore.similarity_search_by_vector_with_relevance_scores(
+            query_embedding,
+            k=TOP_K + retired,  # Room for retired chunks still in the collection
+            filter=_generation_filter(generation)
+        )
+    if retired:
+        results = [(doc, distance) for doc, distance in results if not _is_retired(doc.id, generation)][:TOP_K]
+
+    # Debug: Log distances and content previews (sampled requests only)
+    if debug_enabled():
+        debug_log(f"[RAG] Query: '{query[:50]}...' - Distances: {[round(d, 3) for _, d in results]}")
+        for i, (doc, dist) in enumerate(results):
+            content_preview = doc.page_content[:100].replace('\n', ' ')
+            debug_log(f"[RAG]   {i+1}. [{doc.metadata.get('filename', 'unknown')}] dist={dist:.3f} content: {content_preview}...")
 
     # Filter by distance threshold - only keep documents within threshold
     # Lower distance = more relevant, so we keep docs with distance < threshold
@@ -202,19 +685,89 @@ def retrieve_with_scores(query: str, force_reload=False):
         if distance <= DISTANCE_THRESHOLD
     ]
 
-    print(f"[RAG] Filtered {len(results)} -> {len(filtered_results)} docs (threshold: {DISTANCE_THRESHOLD})")
+    debug_log(f"[RAG] Filtered {len(results)} -> {len(filtered_results)} docs (threshold: {DISTANCE_THRESHOLD})")
+    return filtered_results
+
+
+def _lexical_search(vectorstore, query):
+    """BM25 search; returns [(Document, bm25_score)] without any embedding call."""
+    generation = _index_generation
+    retired = len(_retired)
+    with stage_timer("lexical_search"):
+        ranked = _lexical_index.search(
+            query,
+            k=TOP_K + retired,
+            max_generation=generation,
+            min_score=LEXICAL_MIN_SCORE
+        )
+        if retired:
+            ranked = [(cid, score) for cid, score in ranked if not _is_retired(cid, generation)][:TOP_K]
+        if not ranked:
+            debug_log(f"[RAG] Lexical: no matches for '{query[:50]}...'")
+            return []
+
+        docs_by_id = {doc.id: doc for doc in vectorstore.get_by_ids([cid for cid, _ in ranked])}
+    results = [(docs_by_id[cid], score) for cid, score in ranked if cid in docs_by_id]
+    debug_log(f"[RAG] Lexical: {[(doc.metadata.get('filename', 'unknown'), round(s, 2)) for doc, s in results]}")
+    return results
+
+
+def _fuse_rankings(vector_results, lexical_results):
+    """
+    Reciprocal rank fusion of the vector and lexical rankings.
+    Returns [(Document, score)] best first; score is normalized so a chunk
+    ranked first by both retrievers scores 1.0.
+    """
+    fused = {}
+    for ranking in (vector_results, lexical_results):
+        for rank, (doc, _) in enumerate(ranking, start=1):
+            entry = fused.setdefault(doc.id, [doc, 0.0])
+            entry[1] += 1 / (RRF_K + rank)
 
-    # Convert distance to similarity score (0-1, higher = more similar)
-    # Using formula: similarity = 1 / (1 + distance)
-    scored_results = [
-        (doc, round(1 / (1 + distance), 3))
-        for doc, distance in filtered_results
-    ]
+    best_possible = 2 / (RRF_K + 1)
+    ranked = sorted(fused.values(), key=lambda item: item[1], reverse=True)
+    return [(doc, round(score / best_possible, 3)) for doc, score in ranked]
 
-    # Limit to max results
-    scored_results = scored_results[:MAX_RESULTS]
 
-    return scored_results
+def retrieve_with_scores(query: str, force_reload=False, mode=None):
+    """
+    Retrieve documents with relevance scores and filter by threshold.
+    Only returns documents that are actually relevant to the query.
+    mode overrides RETRIEVAL_MODE ("vector", "lexical" or "hybrid").
+
+    Returns: List of (Document, score) tuples where score is normalized 0-1 (higher = more relevant)
+    """
+    mode = mode or RETRIEVAL_MODE
+    vectorstore = _ensure_vectorstore(force_reload)
+
+    cache_key = (_normalize_query(query), _index_generation, mode)
+    cached = _results_cache.get(cache_key)
+    if cached is not None:
+        return list(cached)
+
+    if mode == "lexical":
+        lexical_results = _lexical_search(vectorstore, query)
+        top_score = lexical_results[0][1] if lexical_results else 1.0
+        scored_results = [(doc, round(score / top_score, 3)) for doc, score in lexical_results]
+
+    elif mode == "hybrid":
+        scored_results = _fuse_rankings(
+            _vector_search(vectorstore, query),
+            _lexical_search(vectorstore, query)
+        )
+
+    else:
+        # Convert distance to similarity score (0-1, higher = more similar)
+        # Using formula: similarity = 1 / (1 + distance)
+        scored_results = [
+            (doc, round(1 / (1 + distance), 3))
+            for doc, distance in _vector_search(vectorstore, query)
+        ]
+
+    # Limit to max results
+    scored_results = [(_set_total_chunks(doc), score) for doc, score in scored_results[:MAX_RESULTS]]
+    _results_cache.put(cache_key, scored_results)
+    return list(scored_results)
 
 
 def build_retriever(force_reload=False):
@@ -225,5 +778,5 @@ def build_retriever(force_reload=False):
     vectorstore = _ensure_vectorstore(force_reload)
     return vectorstore.as_retriever(
         search_type="similarity",
-        search_kwargs={"k": TOP_K}
+        search_kwargs={"k": TOP_K, "filter": _generation_filter()}
     )
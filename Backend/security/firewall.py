@@ -4,22 +4,35 @@ ZeroSec Firewall — Optimized Security Module
 - SQL/XSS/Command injection detection
 - Document inspection and PII redaction (regex + optional ML model)
 - LRU caching for performance
+- Literal prefilter, so most regexes are never run on clean text
+- ML models load lazily (the PII pipeline also in a background warm-up), so pattern checks work right after import
 - Provides small API:
     - detect_injection(text) -> (bool, float)
     - inspect_document_text(text) -> {"include": bool, "safe_text": str or None, "reason": str, "patterns": [...]}
+    - inspect_documents(texts) -> [inspect_document_text result, ...] with batched ML scoring
+    - inspection_metadata(texts) / inspection_from_metadata(metadata, text) -> inspect once at index time
     - sanitize_text(text) -> str
+    - StreamingSanitizer -> incremental sanitize_text for streamed LLM output
     - inspect_text(text) -> full generic inspection (keeps backwards compatibility)
+    - start_model_warmup() / get_model_status() -> background model loading and readiness
 """
 
 import re
+import threading
+import time
 from queue import Queue
+try:
+    from re import _parser as _sre_parse, _constants as _sre
+except ImportError:  # Python < 3.11
+    import sre_parse as _sre_parse, sre_constants as _sre
 from functools import lru_cache
 from hashlib import md5
 from pathlib import Path
-from pytector import PromptInjectionDetector
-import joblib
 import os
 
+from backend.utils.cache import LRUCache
+from backend.utils.counters import ShardedCounter
+
 # -------------------------
 # CONFIG
 # -------------------------
@@ -32,6 +45,8 @@ BASE_DIR = Path(__file__).resolve().parents[1]  # Backend directory
 PII_MODEL_PATH = BASE_DIR / "models" / "pii_pipeline.pkl"
 ML_PII_CONFIDENCE_THRESHOLD = 0.9
 CACHE_SIZE = 512  # LRU cache size for detection results
+CACHE_TTL = 3600  # Seconds a cached detection result stays valid
+STREAM_HOLDBACK = 64  # Characters held back while streaming, so a secret split across tokens is still seen whole
 
 # -------------------------
 # PATTERNS (Tuned to reduce false positives)
@@ -93,6 +108,17 @@ CMD_INJECTION_PATTERNS = [
     re.compile(r"\$\([^)]*(?:cat|rm|wget|curl|bash)[^)]*\)"),
 ]
 
+# Checked in this order; the first family with a match decides the attack type
+INJECTION_FAMILIES = {
+    "prompt_injection": INJECTION_PATTERNS,
+    "sql_injection": SQL_INJECTION_PATTERNS,
+    "xss": XSS_PATTERNS,
+    "cmd_injection": CMD_INJECTION_PATTERNS,
+}
+
+# Words that mark a chunk as documentation about attacks rather than an attack
+DOC_INDICATORS = ["example", "documentation", "how to prevent", "security", "vulnerability"]
+
 # Exfiltration keywords - only when combined with action verbs
 EXFIL_KEYWORDS = [
     "password", "passwd", "private key", "private_key",
@@ -100,43 +126,212 @@ EXFIL_KEYWORDS = [
 ]
 
 # -------------------------
-# INITIALIZE MODELS
+# LITERAL PREFILTER
 # -------------------------
-print("Loading prompt-injection model...")
-_detector = PromptInjectionDetector(model_name_or_url=MODEL)
+# Every pattern is paired with literals that any match must contain (read
+# from the parsed pattern, e.g. "xp_cmdshell" or any of "prompt"/"instructions").
+# Substring checks are far cheaper than a regex scan, so a pattern only runs on
+# text containing one of its literals; everything else skips it. Results are
+# identical to running every pattern. (One big alternation was measured and is
+# slower than separate scans under Python's re.)
+def _required_literals(parsed):
+    """Literals of which every match contains at least one, or None if unknown."""
+    best, run = None, ""
+
+    def keep(candidate):
+        nonlocal best
+        if candidate and (best is None or min(map(len, candidate)) > min(map(len, best))):
+            best = candidate
+
+    for op, av in parsed:
+        if op is _sre.LITERAL:
+            run += chr(av)
+            continue
+        if op is _sre.AT:  # Zero-width (\b, ^, $) - the literal run continues
+            continue
+        keep((run,) if run else None)
+        run = ""
+        if op is _sre.SUBPATTERN:
+            _, add_flags, del_flags, sub = av
+            if not (add_flags | del_flags) & re.I:
+                keep(_required_literals(sub))
+        elif op is _sre.BRANCH:
+            alternatives = [_required_literals(branch) for branch in av[1]]
+            if all(alternatives):
+                keep(tuple(lit for alt in alternatives for lit in alt))
+        elif op in (_sre.MAX_REPEAT, _sre.MIN_REPEAT) and av[0] >= 1:
+            keep(_required_literals(av[2]))
+    keep((run,) if run else None)
+    return best
+
+
+def _prefiltered(named_patterns) -> list:
+    """[(name, rx)] -> [(name, rx, literals or None, ignorecase)]."""
+    out = []
+    for name, rx in named_patterns:
+        try:
+            literals = _required_literals(_sre_parse.parse(rx.pattern, rx.flags))
+        except Exception:
+            literals = None
+        if literals and not all(lit.isascii() for lit in literals):
+            literals = None
+        ignorecase = bool(rx.flags & re.I)
+        if literals and ignorecase:
+            literals = tuple(lit.lower() for lit in literals)
+        out.append((name, rx, literals, ignorecase))
+    return out
+
+
+def _candidates(prefiltered, text: str) -> list:
+    """(name, rx) for the patterns whose literals occur in text."""
+    # Lowercasing is only equivalent to IGNORECASE matching for ASCII text
+    lowered = text.lower() if text.isascii() else None
+    out = []
+    for name, rx, literals, ignorecase in prefiltered:
+        haystack = lowered if ignorecase else text
+        if literals and haystack is not None and not any(lit in haystack for lit in literals):
+            continue
+        out.append((name, rx))
+    return out
+
+
+_INJECTION_PREFILTERED = _prefiltered(
+    (attack_type, rx) for attack_type, patterns in INJECTION_FAMILIES.items() for rx in patterns
+)
+_SECRETS_PREFILTERED = _prefiltered(SECRET_PATTERNS.items())
+
+# Streaming: a run of these characters reaching the end of the text may still
+# grow into a secret (JWT, card number, email, key...), so it is never split
+_STREAM_TOKEN_RUN = re.compile(r"[A-Za-z0-9_.%+@\-]+\Z")
+# Multi-word secrets whose opening has arrived but whose match is not complete yet
+_STREAM_OPEN_PREFIXES = re.compile(r"Bearer\s*[A-Za-z0-9_-]*\Z|-----BEGIN[A-Z ]*-*\Z", re.I)
 
-# Try to load ML PII pipeline (optional)
+
+def _rules_version() -> str:
+    """Fingerprint of everything that decides a document inspection result."""
+    rules = [
+        [(name, rx.pattern, rx.flags) for name, rx in SECRET_PATTERNS.items()],
+        [(name, [(rx.pattern, rx.flags) for rx in patterns]) for name, patterns in INJECTION_FAMILIES.items()],
+        DOC_INDICATORS, MIN_TEXT_LENGTH_FOR_ML, ML_PII_CONFIDENCE_THRESHOLD,
+    ]
+    if PII_MODEL_PATH.exists():
+        stat = PII_MODEL_PATH.stat()
+        rules.append((stat.st_size, stat.st_mtime))
+    return md5(repr(rules).encode()).hexdigest()[:12]
+
+
+# Stored with precomputed chunk inspections; a mismatch means "inspect again"
+RULES_VERSION = _rules_version()
+
+
+# -------------------------
+# MODELS (loaded lazily)
+# -------------------------
+# Nothing heavy is imported here: torch/transformers and the PII pipeline load
+# on first real use or from start_model_warmup(). Pattern checks never wait.
+_detector = None
 _pii_pipeline = None
 _pii_model = None
 _pii_vectorizer = None
-if PII_MODEL_PATH.exists():
-    try:
-        print(f"Loading ML-based PII pipeline from {PII_MODEL_PATH} ...")
-        _pii_pipeline = joblib.load(str(PII_MODEL_PATH))
-        # pipeline expected to contain {"vectorizer": ..., "models": {"Random Forest": model, ...}}
-        _pii_vectorizer = _pii_pipeline.get("vectorizer")
-        _pii_model = _pii_pipeline.get("models", {}).get("Random Forest", None)
-        if _pii_model is None:
-            # fallback: try to pick any model in the dict
-            models = _pii_pipeline.get("models", {})
-            if models:
-                _pii_model = list(models.values())[0]
-
-        if _pii_model is not None:
-            print(f"[firewall] ML PII model loaded successfully!")
-        else:
-            print(f"[firewall] Warning: Pipeline loaded but no model found")
-    except Exception as e:
-        print(f"[firewall] Failed to load ML pipeline: {e}")
-        _pii_pipeline = None
-else:
-    print(f"[firewall] PII pipeline not found at {PII_MODEL_PATH}; continuing with regex-only redaction.")
-    print(f"[firewall] Expected path: {PII_MODEL_PATH.resolve()}")
+
+# model name -> {"status": not_loaded | loading | loaded | unavailable | failed, ...}
+_model_status = {
+    "prompt_injection": {"status": "not_loaded"},
+    "pii": {"status": "not_loaded"},
+}
+_model_locks = {name: threading.Lock() for name in _model_status}
+_SETTLED = ("loaded", "unavailable", "failed")
+# Models the warm-up loads and readiness waits for. The prompt-injection
+# detector is left out: it loads only when get_injection_detector() is called.
+_WARMUP_MODELS = ("pii",)
+
+
+def _load_model(name, loader):
+    """Run loader once for a model, recording its status; concurrent callers wait for it."""
+    if _model_status[name]["status"] in _SETTLED:
+        return
+    with _model_locks[name]:
+        if _model_status[name]["status"] in _SETTLED:
+            return
+        _model_status[name] = {"status": "loading"}
+        started = time.time()
+        try:
+            status = loader()
+            _model_status[name] = {"status": status, "load_seconds": round(time.time() - started, 2)}
+        except Exception as e:
+            print(f"[firewall] Failed to load {name} model: {e}")
+            _model_status[name] = {"status": "failed", "error": str(e)}
+
+
+def _load_detector():
+    global _detector
+    print("Loading prompt-injection model...")
+    from pytector import PromptInjectionDetector
+    _detector = PromptInjectionDetector(model_name_or_url=MODEL)
+    return "loaded"
+
+
+def _load_pii_pipeline():
+    """Try to load ML PII pipeline (optional)."""
+    global _pii_pipeline, _pii_model, _pii_vectorizer
+    if not PII_MODEL_PATH.exists():
+        print(f"[firewall] PII pipeline not found at {PII_MODEL_PATH}; continuing with regex-only redaction.")
+        print(f"[firewall] Expected path: {PII_MODEL_PATH.resolve()}")
+        return "unavailable"
+
+    import joblib
+    print(f"Loading ML-based PII pipeline from {PII_MODEL_PATH} ...")
+    pipeline = joblib.load(str(PII_MODEL_PATH))
+    # pipeline expected to contain {"vectorizer": ..., "models": {"Random Forest": model, ...}}
+    vectorizer = pipeline.get("vectorizer")
+    model = pipeline.get("models", {}).get("Random Forest", None)
+    if model is None:
+        # fallback: try to pick any model in the dict
+        models = pipeline.get("models", {})
+        if models:
+            model = list(models.values())[0]
+
+    _pii_pipeline, _pii_vectorizer, _pii_model = pipeline, vectorizer, model
+    if _pii_model is not None:
+        print(f"[firewall] ML PII model loaded successfully!")
+        return "loaded"
+    print(f"[firewall] Warning: Pipeline loaded but no model found")
+    return "unavailable"
+
+
+def get_injection_detector():
+    """The ML prompt-injection detector, loading it on first use (None if it failed)."""
+    _load_model("prompt_injection", _load_detector)
+    return _detector
+
+
+def _ensure_pii_model():
+    """Load the PII pipeline on first use; callers block only while it is loading."""
+    _load_model("pii", _load_pii_pipeline)
+
+
+def start_model_warmup():
+    """Load the warm-up models on a background thread so the first real use doesn't pay for it."""
+    def warmup():
+        _ensure_pii_model()
+        print(f"[firewall] Models ready: {get_model_status()}")
+
+    threading.Thread(target=warmup, name="firewall-warmup", daemon=True).start()
+
+
+def get_model_status() -> dict:
+    """Per-model load status; "ready" once every warm-up model has finished loading (or given up)."""
+    models = {name: dict(state) for name, state in _model_status.items()}
+    return {
+        "ready": all(models[name]["status"] in _SETTLED for name in _WARMUP_MODELS),
+        "models": models,
+    }
+
 
 print("Firewall Ready ✅")
 
-# Stats + queue
-stats = {"total_queries": 0, "total_blocks": 0}
+# Stats + queue (sharded: request threads update them concurrently)
+stats = ShardedCounter(("total_queries", "total_blocks"))
 event_queue = Queue()
 
 
@@ -148,13 +343,35 @@ def _get_text_hash(text: str) -> str:
     return md5(text.encode()).hexdigest()
 
 
-def _find_secret_patterns(text: str) -> list:
-    """Find all secret patterns in text."""
-    found = []
+def _scan_secrets(text: str) -> tuple:
+    """
+    Detect and redact secrets. Returns (pattern names found, sanitized text).
+    Only patterns passing the literal prefilter are searched, and clean text
+    is returned as is; otherwise every pattern is substituted in turn, exactly
+    as before.
+    """
+    found = [name for name, rx in _candidates(_SECRETS_PREFILTERED, text) if rx.search(text)]
+    if not found:
+        return [], text
+    out = text
     for name, rx in SECRET_PATTERNS.items():
-        if rx.search(text):
-            found.append(name)
-    return found
+        out = rx.sub(f"<REDACTED:{name}>", out)
+    return found, out
+
+
+def _find_secret_spans(text: str) -> list:
+    """
+    Find (start, end, name) for every secret pattern match in text, overlapping
+    ones included: once an earlier pattern has been redacted, a later pattern
+    can match text that its non-overlapping matches in the raw text skipped.
+    """
+    spans = []
+    for name, rx in _candidates(_SECRETS_PREFILTERED, text):
+        m = rx.search(text)
+        while m:
+            spans.append((m.start(), m.end(), name))
+            m = rx.search(text, m.start() + 1)
+    return spans
 
 
 def _find_exfil_keywords(text: str) -> list:
@@ -172,39 +389,22 @@ def _check_injection_patterns(text: str) -> tuple:
     if len(text) < 30:
         return False, None, 0.0
 
-    # Prompt injection - explicit jailbreak attempts
-    for pattern in INJECTION_PATTERNS:
-        if pattern.search(text):
-            return True, "prompt_injection", 0.9
-
-    # SQL injection - classic SQL attack patterns
-    for pattern in SQL_INJECTION_PATTERNS:
-        if pattern.search(text):
-            return True, "sql_injection", 0.9
-
-    # XSS - script tags and event handlers
-    for pattern in XSS_PATTERNS:
-        if pattern.search(text):
-            return True, "xss", 0.9
-
-    # Command injection - shell commands
-    for pattern in CMD_INJECTION_PATTERNS:
-        if pattern.search(text):
-            return True, "cmd_injection", 0.9
+    # Prompt injection, SQL injection, XSS, command injection - in that order
+    for attack_type, rx in _candidates(_INJECTION_PREFILTERED, text):
+        if rx.search(text):
+            return True, attack_type, 0.9
 
     return False, None, 0.0
 
 
 def _sanitize_regex(text: str) -> str:
     """Sanitize text by redacting sensitive patterns."""
-    out = text
-    for name, rx in SECRET_PATTERNS.items():
-        out = rx.sub(f"<REDACTED:{name}>", out)
-    return out
+    return _scan_secrets(text)[1]
 
 
 def _detect_pii_ml(text: str) -> tuple:
     """Return (flag, confidence). If no ML model available, return (False, 0.0)."""
+    _ensure_pii_model()
     if _pii_model is None or _pii_vectorizer is None:
         return False, 0.0
     try:
@@ -221,8 +421,28 @@ def _detect_pii_ml(text: str) -> tuple:
         return False, 0.0
 
 
+def _detect_pii_ml_batch(texts: list) -> list:
+    """_detect_pii_ml for many texts, vectorized and scored in one call each."""
+    if not texts:
+        return []
+    _ensure_pii_model()
+    if _pii_model is None or _pii_vectorizer is None:
+        return [(False, 0.0)] * len(texts)
+    try:
+        X = _pii_vectorizer.transform(texts)
+        if hasattr(_pii_model, "predict_proba"):
+            confidences = [float(proba[1]) for proba in _pii_model.predict_proba(X)]
+            return [(c >= ML_PII_CONFIDENCE_THRESHOLD, c) for c in confidences]
+        else:
+            return [(bool(pred), 1.0) for pred in _pii_model.predict(X)]
+    except Exception as e:
+        # One bad item shouldn't cost the whole batch its scores
+        print(f"[firewall] ML PII batch detection error: {e}; scoring one at a time")
+        return [_detect_pii_ml(text) for text in texts]
+
+
 # Detection cache
-_injection_cache = {}
+_injection_cache = LRUCache(CACHE_SIZE, ttl=CACHE_TTL)
 
 
 # -------------------------
@@ -240,45 +460,49 @@ def detect_injection(text: str) -> tuple:
 
     # Check cache first
     text_hash = _get_text_hash(text)
-    if text_hash in _injection_cache:
-        return _injection_cache[text_hash]
+    cached = _injection_cache.get(text_hash)
+    if cached is not None:
+        return cached
 
     # ONLY pattern-based detection - no ML model (causes too many false positives)
     pattern_detected, attack_type, pattern_score = _check_injection_patterns(text)
     result = (pattern_detected, pattern_score) if pattern_detected else (False, 0.0)
 
     # Cache result
-    _injection_cache[text_hash] = result
-    if len(_injection_cache) > CACHE_SIZE:
-        _injection_cache.pop(next(iter(_injection_cache)))
+    _injection_cache.put(text_hash, result)
 
     return result
 
 
+def detect_attack(text: str):
+    """Attack family matched by text (e.g. "sql_injection"), or None."""
+    if not text or len(text.strip()) < 30:
+        return None
+    return _check_injection_patterns(text)[1]
+
+
 def inspect_text(text: str) -> dict:
     """
     Text inspection - optimized for MINIMAL false positives.
     - Only blocks explicit attack patterns
     - Normal queries always pass through
     """
-    stats["total_queries"] += 1
+    stats.inc("total_queries")
 
     # Check for injection (already very conservative)
     inj, score = detect_injection(text)
-    patterns = _find_secret_patterns(text)
+    patterns, sanitized = _scan_secrets(text)
 
     # Only block if BOTH injection detected AND score is very high
     if inj and score >= INJECTION_THRESHOLD:
         action = "BLOCK"
-        stats["total_blocks"] += 1
+        stats.inc("total_blocks")
         reason = "injection"
     else:
         # Everything else is allowed
         action = "ALLOW"
         reason = "clean" if not patterns else "pii_sanitized"
 
-    sanitized = _sanitize_regex(text) if patterns else text
-
     result = {
         "original": text,
         "sanitized": sanitized,
@@ -294,24 +518,19 @@ def inspect_text(text: str) -> dict:
     return result
 
 
-def inspect_document_text(text: str) -> dict:
+def _inspect_patterns(text: str):
     """
-    Document inspection for RAG - optimized for low false positives.
-    - Almost always includes documents (we want RAG to work)
-    - Only excludes if document contains active attack code
-    - PII is redacted but content passes through
+    Pattern stage of document inspection.
+    Returns the final result for an excluded document, otherwise (patterns, safe_text).
     """
-    stats["total_queries"] += 1
-
     # Only check for active attacks in documents (not ML model - too many false positives)
     pattern_inj, attack_type, confidence = _check_injection_patterns(text)
 
     # Only exclude documents with very high confidence attacks
     if pattern_inj and confidence >= 0.85:
         # Double check - is this really an attack or just documentation about attacks?
-        doc_indicators = ["example", "documentation", "how to prevent", "security", "vulnerability"]
         text_lower = text.lower()
-        if any(ind in text_lower for ind in doc_indicators):
+        if any(ind in text_lower for ind in DOC_INDICATORS):
             # Likely documentation, not an actual attack - allow with sanitization
             pass
         else:
@@ -323,34 +542,112 @@ def inspect_document_text(text: str) -> dict:
                 "exfil": []
             }
 
-    # Find PII patterns for redaction (regex-based)
-    patterns = _find_secret_patterns(text)
+    # Find and redact PII patterns (regex-based)
+    return _scan_secrets(text)
+
+
+def inspect_document_text(text: str) -> dict:
+    """
+    Document inspection for RAG - optimized for low false positives.
+    - Almost always includes documents (we want RAG to work)
+    - Only excludes if document contains active attack code
+    - PII is redacted but content passes through
+    """
+    return inspect_documents([text])[0]
+
+
+def inspect_documents(texts: list) -> list:
+    """
+    inspect_document_text for many documents or chunks at once.
+    Pattern checks run per item; the ML PII model vectorizes and scores every
+    eligible item in a single call. Results match the single-item path.
+    """
+    stats.inc("total_queries", len(texts))
+    staged = [_inspect_patterns(text) for text in texts]
 
     # ML-based PII detection (if model available and text is long enough)
-    ml_pii_detected = False
-    ml_confidence = 0.0
-    if len(text) >= MIN_TEXT_LENGTH_FOR_ML:
-        ml_pii_detected, ml_confidence = _detect_pii_ml(text)
+    ml_items = [
+        i for i, (text, stage) in enumerate(zip(texts, staged))
+        if not isinstance(stage, dict) and len(text) >= MIN_TEXT_LENGTH_FOR_ML
+    ]
+    ml_scores = dict(zip(ml_items, _detect_pii_ml_batch([texts[i] for i in ml_items])))
+
+    results = []
+    for i, stage in enumerate(staged):
+        if isinstance(stage, dict):
+            results.append(stage)
+            continue
+
+        patterns, safe_text = stage
+        ml_pii_detected, ml_confidence = ml_scores.get(i, (False, 0.0))
         if ml_pii_detected and _pii_model is not None:
             print(f"[firewall] ML PII detected with confidence {ml_confidence:.2f}")
 
-    # Always include, just sanitize sensitive data
-    safe_text = _sanitize_regex(text)
+        # Determine reason based on detection results
+        if patterns or ml_pii_detected:
+            reason = "partially_redacted"
+        else:
+            reason = "clean"
+
+        # Always include, just sanitize sensitive data
+        results.append({
+            "include": True,
+            "safe_text": safe_text,
+            "reason": reason,
+            "patterns": patterns,
+            "exfil": [],
+            "ml_pii": ml_pii_detected,
+            "ml_confidence": ml_confidence
+        })
+    return results
+
+
+def inspection_metadata(texts: list) -> list:
+    """
+    Inspect chunks at index time (as one batch) and return each result as
+    flat metadata fields (Chroma metadata only holds scalars). safe_text is
+    only stored when redaction changed the text.
+    """
+    out = []
+    for text, info in zip(texts, inspect_documents(texts)):
+        fields = {
+            "fw_version": RULES_VERSION,
+            "fw_include": info["include"],
+            "fw_reason": info["reason"],
+            "fw_patterns": ",".join(info.get("patterns", [])),
+            "fw_ml_pii": bool(info.get("ml_pii", False)),
+            "fw_ml_confidence": float(info.get("ml_confidence", 0.0)),
+        }
+        if info["safe_text"] is not None and info["safe_text"] != text:
+            fields["fw_safe_text"] = info["safe_text"]
+        out.append(fields)
+    return out
 
-    # Determine reason based on detection results
-    if patterns or ml_pii_detected:
-        reason = "partially_redacted"
-    else:
-        reason = "clean"
 
+def inspection_from_metadata(metadata: dict, text: str):
+    """
+    Rebuild the inspect_document_text result stored by inspection_metadata.
+    Returns None if the chunk was never inspected or the rules have changed since.
+    """
+    if metadata.get("fw_version") != RULES_VERSION:
+        return None
+    if not metadata["fw_include"]:
+        return {
+            "include": False,
+            "safe_text": None,
+            "reason": metadata["fw_reason"],
+            "patterns": [],
+            "exfil": []
+        }
+    patterns = metadata.get("fw_patterns", "")
     return {
         "include": True,
-        "safe_text": safe_text,
-        "reason": reason,
-        "patterns": patterns,
+        "safe_text": metadata.get("fw_safe_text", text),
+        "reason": metadata["fw_reason"],
+        "patterns": patterns.split(",") if patterns else [],
         "exfil": [],
-        "ml_pii": ml_pii_detected,
-        "ml_confidence": ml_confidence
+        "ml_pii": metadata.get("fw_ml_pii", False),
+        "ml_confidence": metadata.get("fw_ml_confidence", 0.0)
     }
 
 
@@ -359,16 +656,74 @@ def sanitize_text(text: str) -> str:
     return _sanitize_regex(text)
 
 
+class StreamingSanitizer:
+    """
+    Apply sanitize_text to text that arrives in pieces (e.g. LLM tokens).
+    The last STREAM_HOLDBACK characters are held back, and text is never
+    released part-way through a secret match, a word that may still be growing
+    (however long) or an unfinished "Bearer"/"-----BEGIN" opening, so a secret
+    straddling token boundaries is redacted exactly as if the whole text were
+    sanitized at once.
+    """
+
+    def __init__(self, holdback: int = STREAM_HOLDBACK):
+        self.holdback = holdback
+        self._pending = ""
+
+    def feed(self, chunk: str) -> str:
+        """Add a piece of text; return the sanitized text that is safe to release."""
+        self._pending += chunk
+        cut = len(self._pending) - self.holdback
+        if cut <= 0:
+            return ""
+
+        # Prefer releasing whole words
+        space = max(self._pending.rfind(" ", 0, cut), self._pending.rfind("\n", 0, cut))
+        if space > 0:
+            cut = space + 1
+
+        # Never release the opening of a multi-word secret that is still arriving
+        opening = _STREAM_OPEN_PREFIXES.search(self._pending)
+        if opening:
+            cut = min(cut, opening.start())
+
+        spans = _find_secret_spans(self._pending)
+        while cut > 0:
+            moved = cut
+            # Never split a word: it may still be growing into a secret (e.g. a JWT
+            # longer than the holdback), and splitting it changes \b boundaries
+            run = _STREAM_TOKEN_RUN.search(self._pending, 0, moved)
+            if run and moved < len(self._pending) and _STREAM_TOKEN_RUN.match(self._pending, moved, moved + 1):
+                moved = run.start()
+            # Never release part of a match, or the start of one reaching into the tail
+            for start, end, _ in spans:
+                if start < moved < end:
+                    moved = start
+            if moved == cut:
+                break
+            cut = moved
+        if cut <= 0:
+            return ""
+
+        released, self._pending = self._pending[:cut], self._pending[cut:]
+        return _sanitize_regex(released)
+
+    def flush(self) -> str:
+        """Release everything still held back."""
+        released, self._pending = self._pending, ""
+        return _sanitize_regex(released)
+
+
 def clear_cache():
     """Clear the injection detection cache."""
-    global _injection_cache
-    _injection_cache = {}
+    _injection_cache.clear()
 
 
 def get_stats() -> dict:
     """Get firewall statistics."""
     return {
-        **stats,
+        **stats.snapshot(),
         "cache_size": len(_injection_cache),
+        "cache": _injection_cache.get_stats(),
         "ml_pii_available": _pii_model is not None
     }
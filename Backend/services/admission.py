@@ -0,0 +1,157 @@
+"""
+Admission control for the query pipeline.
+- Caps how many LLM generations run at once against the local Ollama instance
+- Requests beyond the cap wait in a bounded queue; past that they are rejected
+  immediately with a Retry-After estimate instead of piling onto the model
+- Runs the other pipeline stages (retrieval, firewall) with per-stage timeouts
+  on a bounded pool: work that timed out is cancelled if it has not started,
+  and new work is rejected once the pool's backlog is full
+"""
+
+import contextvars
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
+
+class OverloadedError(Exception):
+    """Raised when a request cannot be admitted; carries the HTTP status to answer with."""
+
+    def __init__(self, reason: str, retry_after: int, status: int = 429):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status = status
+
+
+class StageTimeoutError(Exception):
+    """Raised when a pipeline stage does not finish within its time budget."""
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"{stage} timed out after {timeout}s")
+        self.stage = stage
+        self.timeout = timeout
+
+
+class AdmissionController:
+    """Semaphore with a bounded wait queue and a Retry-After estimate."""
+
+    def __init__(self, max_in_flight: int, max_waiting: int, wait_timeout: float):
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._avg_seconds = 5.0  # Moving average of how long a slot is held
+        self.stats = {"admitted": 0, "queued": 0, "rejected_full": 0, "rejected_timeout": 0}
+
+    def _retry_after(self) -> int:
+        """Seconds until the current backlog should have drained."""
+        backlog = (self._in_flight + self._waiting) / self.max_in_flight
+        return max(1, math.ceil(backlog * self._avg_seconds))
+
+    @contextmanager
+    def slot(self):
+        """Hold one generation slot for the duration of the block."""
+        with self._cond:
+            if self._in_flight >= self.max_in_flight:
+                if self._waiting >= self.max_waiting:
+                    self.stats["rejected_full"] += 1
+                    raise OverloadedError("queue_full", self._retry_after(), status=429)
+
+                self._waiting += 1
+                self.stats["queued"] += 1
+                deadline = time.monotonic() + self.wait_timeout
+                try:
+                    while self._in_flight >= self.max_in_flight:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.stats["rejected_timeout"] += 1
+                            raise OverloadedError("queue_timeout", self._retry_after(), status=503)
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            self._in_flight += 1
+            self.stats["admitted"] += 1
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * (time.monotonic() - started)
+                self._cond.notify()
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            return {
+                **self.stats,
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "max_in_flight": self.max_in_flight,
+                "max_waiting": self.max_waiting,
+                "avg_generation_seconds": round(self._avg_seconds, 2),
+            }
+
+
+# -------------------------
+# STAGE TIMEOUTS
+# -------------------------
+STAGE_WORKERS = 32  # Threads running pipeline stages
+STAGE_MAX_PENDING = 64  # Stage calls queued or running at once; beyond this requests are rejected
+
+_stage_pool = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="rag-stage")
+_stage_lock = threading.Lock()
+_stage_pending = 0
+_stage_stats = {"submitted": 0, "timed_out": 0, "cancelled": 0, "rejected": 0}
+
+
+def _stage_done(_future):
+    global _stage_pending
+    with _stage_lock:
+        _stage_pending -= 1
+
+
+def run_stage(stage: str, timeout: float, fn, *args, **kwargs):
+    """
+    Run fn on the stage pool and wait at most `timeout` seconds for it.
+    Raises StageTimeoutError if it is late. Late work that has not started yet
+    is cancelled; work already running cannot be interrupted and finishes in
+    the background, but the request no longer waits for it.
+    Raises OverloadedError (503) if STAGE_MAX_PENDING calls are already queued
+    or running, so a slow backend can't build an unbounded backlog.
+    """
+    global _stage_pending
+    with _stage_lock:
+        if _stage_pending >= STAGE_MAX_PENDING:
+            _stage_stats["rejected"] += 1
+            raise OverloadedError("stage_pool_full", 1, status=503)
+        _stage_pending += 1
+        _stage_stats["submitted"] += 1
+
+    context = contextvars.copy_context()  # Keep request-scoped state (e.g. debug sampling)
+    try:
+        future = _stage_pool.submit(context.run, fn, *args, **kwargs)
+    except BaseException:
+        _stage_done(None)
+        raise
+    future.add_done_callback(_stage_done)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        cancelled = future.cancel()
+        with _stage_lock:
+            _stage_stats["timed_out"] += 1
+            _stage_stats["cancelled"] += cancelled
+        print(f"[admission] Stage '{stage}' exceeded {timeout}s" + (" (cancelled before it started)" if cancelled else ""))
+        raise StageTimeoutError(stage, timeout) from None
+
+
+def get_stage_stats() -> dict:
+    with _stage_lock:
+        return {**_stage_stats, "pending": _stage_pending, "max_pending": STAGE_MAX_PENDING, "workers": STAGE_WORKERS}
@@ -0,0 +1,80 @@
+"""
+Semantic answer cache for the RAG pipeline.
+Answers are grouped in buckets keyed by everything that shapes the LLM call
+apart from the wording of the question (retrieved chunk ids, model, options,
+index generation). Within a bucket, a new question reuses an answer if its
+embedding is within a cosine-similarity radius of a cached question.
+"""
+
+import math
+import threading
+import time
+
+from backend.utils.cache import LRUCache
+
+
+def _unit(vector):
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def _cosine(a, b):
+    """Cosine similarity of two unit vectors."""
+    return sum(x * y for x, y in zip(a, b))
+
+
+class SemanticAnswerCache:
+    """Size-bounded, TTL-expiring answer cache matched by question similarity."""
+
+    def __init__(self, max_buckets: int = 512, bucket_size: int = 8, ttl: float = 600.0,
+                 min_similarity: float = 0.97):
+        self.bucket_size = bucket_size
+        self.ttl = ttl
+        self.min_similarity = min_similarity
+        self._buckets = LRUCache(max_buckets)  # bucket key -> [(unit embedding, answer, expires_at)]
+        self._lock = threading.Lock()
+        self._generation = None
+        self.hits = 0
+        self.misses = 0
+
+    def _check_generation(self, generation):
+        """Drop everything when the index generation moves on."""
+        if generation != self._generation:
+            self._buckets.clear()
+            self._generation = generation
+
+    def get(self, bucket_key, generation, embedding):
+        """Return a cached answer for an equivalent question, or None."""
+        query = _unit(embedding)
+        now = time.monotonic()
+        with self._lock:
+            self._check_generation(generation)
+            entries = self._buckets.get(bucket_key)
+            if entries:
+                entries[:] = [e for e in entries if e[2] > now]
+                best = max(entries, key=lambda e: _cosine(query, e[0]), default=None)
+                if best is not None and _cosine(query, best[0]) >= self.min_similarity:
+                    self.hits += 1
+                    return best[1]
+            self.misses += 1
+            return None
+
+    def put(self, bucket_key, generation, embedding, answer):
+        with self._lock:
+            self._check_generation(generation)
+            entries = self._buckets.get(bucket_key) or []
+            entries.append((_unit(embedding), answer, time.monotonic() + self.ttl))
+            self._buckets.put(bucket_key, entries[-self.bucket_size:])
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "buckets": len(self._buckets),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
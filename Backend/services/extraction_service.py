@@ -0,0 +1,276 @@
+"""
+Document text extraction.
+- One extractor for every consumer (upload scanning, previews, indexing)
+- Normalized text is written once per (file, content hash) to data/docs_converted
+- PDFs are extracted and stored page by page, and can be read back the same way
+- Later reads come from that store instead of re-parsing PDFs/DOCX
+- Bulk loads extract on a (spawned) process pool with a per-file timeout
+"""
+
+import glob
+import multiprocessing
+import os
+import re
+import threading
+import uuid
+from hashlib import sha256
+from pathlib import Path
+
+# -------------------------
+# CONFIG
+# -------------------------
+BASE_DIR = Path(__file__).resolve().parents[1]
+CONVERTED_PATH = BASE_DIR / "data" / "docs_converted"
+HASH_PREFIX_LEN = 16  # Content-hash characters used in stored filenames
+
+# Bulk extraction config
+EXTRACT_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # Processes for bulk extraction
+EXTRACT_TIMEOUT = 120  # Seconds a single file may take before it is skipped
+
+TEXT_EXTENSIONS = ['.txt', '.md', '.log', '.csv', '.json', '.xml', '.html', '.htm']
+PAGE_SEPARATOR = '\f'  # Between pages in stored text; stripped from page content
+READ_BLOCK_SIZE = 64 * 1024  # Characters read at a time when streaming pages back
+
+# path -> (size, mtime, content hash), so previews don't re-hash large files
+_hash_memo = {}
+_hash_memo_lock = threading.Lock()
+
+
+# -------------------------
+# EXTRACTION
+# -------------------------
+def _read_text(file_path):
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        return f.read()
+
+
+def _iter_pdf_pages(file_path):
+    import PyPDF2
+    with open(file_path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        for page in reader.pages:
+            yield page.extract_text() or ''
+
+
+def iter_text_pages(file_path):
+    """
+    Yield a document's text one page at a time (uncached).
+    PDFs yield one item per page without holding the whole text;
+    other formats yield a single item.
+    """
+    file_path = Path(file_path)
+    if file_path.suffix.lower() != '.pdf':
+        yield extract_text_from_file(file_path)
+        return
+
+    try:
+        yield from _iter_pdf_pages(file_path)
+    except Exception as e:
+        print(f"[extraction] Error extracting text from {file_path.name}: {e}")
+
+
+def extract_text_from_file(file_path):
+    """Extract text content from various file formats (uncached)."""
+    file_path = Path(file_path)
+    ext = file_path.suffix.lower()
+
+    try:
+        if ext in TEXT_EXTENSIONS:
+            return _read_text(file_path)
+
+        elif ext == '.pdf':
+            return '\n'.join(_iter_pdf_pages(file_path))
+
+        elif ext == '.docx':
+            import docx
+            doc = docx.Document(file_path)
+            return '\n'.join(p.text for p in doc.paragraphs)
+
+        elif ext == '.doc':
+            try:
+                import pypandoc
+                return pypandoc.convert_file(str(file_path), 'plain')
+            except (ImportError, RuntimeError, OSError):
+                return _read_text(file_path)
+
+        else:
+            return _read_text(file_path)
+
+    except Exception as e:
+        print(f"[extraction] Error extracting text from {file_path.name}: {e}")
+        return ""
+
+
+def _normalize(text):
+    """Normalize extracted text before storing it."""
+    return (text.replace('\r\n', '\n').replace('\r', '\n')
+            .replace(PAGE_SEPARATOR, '\n').replace('\x00', ''))
+
+
+def compute_content_hash(file_path):
+    """SHA-256 of a file's bytes, read in blocks to keep memory flat."""
+    digest = sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _content_hash_for(file_path):
+    """Content hash, memoized on (path, size, mtime)."""
+    stat = file_path.stat()
+    with _hash_memo_lock:
+        memo = _hash_memo.get(str(file_path))
+    if memo and memo[:2] == (stat.st_size, stat.st_mtime):
+        return memo[2]
+    content_hash = compute_content_hash(file_path)
+    with _hash_memo_lock:
+        _hash_memo[str(file_path)] = (stat.st_size, stat.st_mtime, content_hash)
+    return content_hash
+
+
+# -------------------------
+# EXTRACTED-TEXT STORE
+# -------------------------
+def _stored_versions(filename):
+    """All stored text files for a document, whatever their content hash."""
+    pattern = re.compile(re.escape(filename) + r"\.[0-9a-f]{%d}\.txt$" % HASH_PREFIX_LEN)
+    candidates = CONVERTED_PATH.glob(glob.escape(filename) + ".*.txt")
+    return [p for p in candidates if pattern.fullmatch(p.name)]
+
+
+def get_extracted_path(file_path, content_hash=None, tmp_tag=None):
+    """
+    Return the path of the normalized text for file_path, extracting it first
+    if this content hash has not been stored yet. Older versions are removed.
+    tmp_tag names the temp file, so a caller that kills the extraction can remove it.
+    """
+    file_path = Path(file_path)
+    content_hash = content_hash or _content_hash_for(file_path)
+    text_path = _stored_path(file_path, content_hash)
+    if text_path.exists():
+        return text_path
+
+    CONVERTED_PATH.mkdir(parents=True, exist_ok=True)
+
+    # Unique temp name so concurrent extractions of the same file don't collide
+    tmp_path = _tmp_path(text_path, tmp_tag or uuid.uuid4().hex)
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for page_number, page_text in enumerate(iter_text_pages(file_path)):
+                if page_number:
+                    f.write(PAGE_SEPARATOR)
+                f.write(_normalize(page_text))
+        os.replace(tmp_path, text_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    for stale in _stored_versions(file_path.name):
+        if stale != text_path:
+            stale.unlink(missing_ok=True)
+    return text_path
+
+
+def _stored_path(file_path, content_hash):
+    return CONVERTED_PATH / f"{Path(file_path).name}.{content_hash[:HASH_PREFIX_LEN]}.txt"
+
+
+def _tmp_path(text_path, tag):
+    return text_path.with_name(f"{text_path.name}.{tag}.tmp")
+
+
+def _extract_worker(file_path, content_hash, tmp_tag, converted_path):
+    """Process-pool entry point; returns the stored path as a string."""
+    global CONVERTED_PATH
+    CONVERTED_PATH = Path(converted_path)  # Spawned workers don't inherit runtime overrides
+    return str(get_extracted_path(file_path, content_hash, tmp_tag))
+
+
+def extract_many(file_paths, content_hashes=None, workers=None, timeout=None):
+    """
+    Extract many documents into the store, in parallel across processes.
+    content_hashes optionally maps file_path -> known content hash.
+    Returns {file_path: stored text path, or None if it failed or timed out}.
+    Every file is extracted in a worker process, even a single one, so the
+    timeout always holds: a file that exceeds it is skipped, its worker killed
+    at the end and its partial temp file removed, so one pathological PDF
+    cannot stall the batch. Workers are spawned rather than forked, as this
+    process runs server, executor and writer threads.
+    """
+    workers = workers or EXTRACT_WORKERS
+    timeout = timeout or EXTRACT_TIMEOUT
+    content_hashes = content_hashes or {}
+    results = {}
+    todo = []
+
+    for file_path in file_paths:
+        content_hash = content_hashes.get(file_path) or _content_hash_for(Path(file_path))
+        stored = _stored_path(file_path, content_hash)
+        if stored.exists():
+            results[file_path] = stored
+        else:
+            todo.append((file_path, content_hash, uuid.uuid4().hex))
+
+    if not todo:
+        return results
+
+    timed_out = False
+    pool = multiprocessing.get_context("spawn").Pool(processes=min(workers, len(todo)))
+    try:
+        pending = [
+            (file_path, content_hash, tmp_tag,
+             pool.apply_async(_extract_worker, (str(file_path), content_hash, tmp_tag, str(CONVERTED_PATH))))
+            for file_path, content_hash, tmp_tag in todo
+        ]
+        for file_path, _, _, async_result in pending:
+            try:
+                results[file_path] = Path(async_result.get(timeout=timeout))
+            except multiprocessing.TimeoutError:
+                print(f"[extraction] Timed out after {timeout}s extracting {Path(file_path).name}; skipping")
+                results[file_path] = None
+                timed_out = True
+            except Exception as e:
+                print(f"[extraction] Failed extracting {Path(file_path).name}: {e}")
+                results[file_path] = None
+    finally:
+        if timed_out:
+            pool.terminate()  # Kill workers stuck on pathological files
+        else:
+            pool.close()
+        pool.join()
+        # A killed worker never got to remove its temp file
+        for file_path, content_hash, tmp_tag in todo:
+            if results.get(file_path) is None:
+                _tmp_path(_stored_path(file_path, content_hash), tmp_tag).unlink(missing_ok=True)
+
+    return results
+
+
+def iter_extracted_pages(file_path, content_hash=None):
+    """
+    Yield (page_number, text) for a document from the store, numbered from 1.
+    Reads a block at a time, so memory stays proportional to one page.
+    """
+    page_number = 1
+    pending = ''
+    with open(get_extracted_path(file_path, content_hash), 'r', encoding='utf-8') as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), ''):
+            *pages, pending = (pending + block).split(PAGE_SEPARATOR)
+            for page_text in pages:
+                yield page_number, page_text
+                page_number += 1
+    yield page_number, pending
+
+
+def get_text_preview(file_path, length=500):
+    """Get the first `length` characters of a document, with an ellipsis if truncated."""
+    with open(get_extracted_path(file_path), 'r', encoding='utf-8') as f:
+        preview = f.read(length + 1).replace(PAGE_SEPARATOR, '\n')
+    return preview[:length] + "..." if len(preview) > length else preview
+
+
+def remove_extracted_text(filename):
+    """Drop every stored version of a document's text."""
+    for stored in _stored_versions(filename):
+        stored.unlink(missing_ok=True)
@@ -0,0 +1,248 @@
+"""
+Background document ingestion.
+Uploads are saved by the API and handed to a single worker thread, which moves
+each document through Uploaded -> Extracting -> Scanning -> Indexing -> Indexed
+(or Failed) and records the status in docs_metadata.json.
+Jobs live in memory, so at startup resume_interrupted_jobs() re-queues any
+document whose recorded status shows it never finished.
+Queries keep being served from the previous index generation until the
+worker's sync publishes the new one.
+"""
+
+import json
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from queue import Queue
+
+from backend.services.extraction_service import get_extracted_path, iter_extracted_pages
+from backend.services.rag_service import refresh_retriever
+
+# -------------------------
+# CONFIG
+# -------------------------
+BASE_DIR = Path(__file__).resolve().parents[1]
+DOCS_PATH = BASE_DIR / "data" / "docs"
+METADATA_PATH = BASE_DIR / "data" / "docs_metadata.json"
+MAX_TRACKED_JOBS = 500  # Finished jobs kept for /documents/jobs/<id>
+
+# Job status -> progress percentage
+JOB_PROGRESS = {
+    "Uploaded": 0,
+    "Extracting": 20,
+    "Scanning": 50,
+    "Indexing": 70,
+    "Indexed": 100,
+    "Failed": 100,
+}
+RESUMABLE_STATUSES = ("Uploaded", "Extracting", "Scanning", "Indexing")  # Left by a job that never finished
+
+_metadata_lock = threading.Lock()
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+_job_queue = Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+# -------------------------
+# METADATA
+# -------------------------
+def load_metadata():
+    """Load document metadata from JSON file"""
+    if METADATA_PATH.exists():
+        with open(METADATA_PATH, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def save_metadata(metadata):
+    """Save document metadata to JSON file"""
+    with open(METADATA_PATH, 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+
+def update_document_metadata(filename, **fields):
+    """Merge fields into one document's metadata entry (thread-safe)."""
+    with _metadata_lock:
+        metadata = load_metadata()
+        metadata.setdefault(filename, {}).update(fields)
+        save_metadata(metadata)
+        return metadata[filename]
+
+
+def remove_document_metadata(filename):
+    """Drop one document's metadata entry (thread-safe)."""
+    with _metadata_lock:
+        metadata = load_metadata()
+        if filename in metadata:
+            del metadata[filename]
+            save_metadata(metadata)
+
+
+# -------------------------
+# SCANNING
+# -------------------------
+def scan_document(filename, content):
+    """Basic security scanning for documents"""
+    issues = []
+
+    # Check for PII patterns
+    email_pattern = r'\b[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}\b'
+    phone_pattern = r'\b\d{10,15}\b'
+
+    if re.search(email_pattern, content, re.IGNORECASE):
+        issues.append("PII: Email detected")
+    if re.search(phone_pattern, content):
+        issues.append("PII: Phone number detected")
+
+    # Check for potential injection patterns
+    injection_keywords = ['<script>', 'javascript:', 'onerror=', 'eval(', 'exec(']
+    for keyword in injection_keywords:
+        if keyword.lower() in content.lower():
+            issues.append(f"Injection: {keyword} detected")
+
+    return issues
+
+
+def _classify_sensitivity(issues, requested=None):
+    """Use the requested sensitivity if valid, otherwise auto-detect from issues."""
+    requested = (requested or '').lower()
+    if requested in ['high', 'medium', 'low']:
+        return requested.capitalize()
+    return 'High' if any('PII' in issue for issue in issues) else 'Medium' if issues else 'Low'
+
+
+# -------------------------
+# JOBS
+# -------------------------
+def _set_status(job, status, **fields):
+    """Advance a job and mirror its status into the document metadata."""
+    with _jobs_lock:
+        job.update(
+            status=status,
+            progress=JOB_PROGRESS[status],
+            updated_at=datetime.now().isoformat(),
+            **fields
+        )
+    update_document_metadata(job["filename"], status=status)
+
+
+def _process_job(job):
+    filename = job["filename"]
+    file_path = DOCS_PATH / filename
+
+    _set_status(job, "Extracting")
+    get_extracted_path(file_path)
+
+    # Scan page by page so large PDFs are never held in memory whole
+    _set_status(job, "Scanning")
+    issues = []
+    for _, page_text in iter_extracted_pages(file_path):
+        issues.extend(i for i in scan_document(filename, page_text) if i not in issues)
+    # A document re-run without a requested level keeps the one it already has
+    with _metadata_lock:
+        stored = load_metadata().get(filename, {}).get("sensitivity")
+    sensitivity = _classify_sensitivity(issues, job.get("sensitivity") or stored)
+    file_meta = update_document_metadata(
+        filename,
+        sensitivity=sensitivity,
+        acl_tags=['public'] if sensitivity == 'Low' else ['restricted'],
+        issues=issues
+    )
+
+    _set_status(job, "Indexing")
+    refresh_retriever()
+
+    _set_status(job, "Indexed", document={
+        'name': filename,
+        'sensitivity': sensitivity,
+        'status': 'Indexed',
+        'issues': issues,
+        'acl_tags': file_meta['acl_tags']
+    })
+
+
+def _worker_loop():
+    while True:
+        job = _job_queue.get()
+        try:
+            _process_job(job)
+        except Exception as e:
+            print(f"[ingestion] Job {job['id']} for {job['filename']} failed: {e}")
+            try:
+                _set_status(job, "Failed", error=str(e))
+            except Exception:
+                pass
+        finally:
+            _job_queue.task_done()
+
+
+def start_ingestion_worker():
+    """Start the ingestion worker thread if it is not running."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_worker_loop, name="ingestion-worker", daemon=True)
+            _worker.start()
+
+
+def submit_document(filename, sensitivity=None) -> dict:
+    """
+    Queue an already-saved document for extraction, scanning and indexing.
+    Returns a snapshot of the new job.
+    """
+    now = datetime.now().isoformat()
+    job = {
+        "id": uuid.uuid4().hex,
+        "filename": filename,
+        "sensitivity": sensitivity,
+        "status": "Uploaded",
+        "progress": JOB_PROGRESS["Uploaded"],
+        "created_at": now,
+        "updated_at": now,
+        "error": None,
+        "document": None,
+    }
+    with _jobs_lock:
+        _jobs[job["id"]] = job
+        while len(_jobs) > MAX_TRACKED_JOBS:
+            _jobs.popitem(last=False)
+        snapshot = dict(job)
+
+    start_ingestion_worker()
+    _job_queue.put(job)
+    return snapshot
+
+
+def resume_interrupted_jobs() -> int:
+    """
+    Re-queue documents left mid-ingestion by a restart (a RESUMABLE_STATUSES
+    status), so none stays unscanned. Returns how many were queued.
+    """
+    with _metadata_lock:
+        metadata = load_metadata()
+
+    resumed = 0
+    for filename, file_meta in metadata.items():
+        if file_meta.get("status") not in RESUMABLE_STATUSES:
+            continue
+        if not (DOCS_PATH / filename).exists():
+            update_document_metadata(filename, status="Failed", error="File missing after restart")
+            continue
+        submit_document(filename, file_meta.get("requested_sensitivity"))
+        resumed += 1
+
+    if resumed:
+        print(f"[ingestion] Resuming {resumed} interrupted upload(s)")
+    return resumed
+
+
+def get_job(job_id):
+    """Get a snapshot of a job, or None if unknown."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
@@ -0,0 +1,194 @@
+"""
+Pre-aggregated detection analytics.
+- Per-minute and per-hour buckets updated as each decision is logged: counts
+  by decision, reason, stopped_by and firewall attack type, plus a latency
+  histogram per bucket
+- Answering a stats request touches only the buckets (O(buckets), not O(rows));
+  latency percentiles are read off the merged histograms
+- Kept in memory with bounded retention; counts, attack types included, are
+  rebuilt from the log store in the background at startup, each resolution
+  only from its own retention window (latencies are not stored, so latency
+  figures only cover decisions made since the last restart)
+"""
+
+import datetime
+import threading
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+PERCENTILES = (50, 90, 95, 99)
+
+RESOLUTIONS = {
+    # name -> (bucket width in seconds, buckets kept)
+    "minute": (60, 24 * 60),
+    "hour": (3600, 30 * 24),
+}
+
+COUNTED_FIELDS = ("decision", "reason", "stopped_by", "attack_type")
+
+
+def _new_bucket():
+    return {
+        "total": 0,
+        **{f"by_{field}": {} for field in COUNTED_FIELDS},
+        "latency_ms": [0] * (len(LATENCY_BUCKETS_MS) + 1),  # Last slot is overflow
+        "latency_count": 0,
+        "latency_sum_ms": 0.0,
+    }
+
+
+def _normalize_reason(reason: str) -> str:
+    """Drop free-text detail ("llm_error: ...") so reasons stay a small set."""
+    return (reason or "").split(":", 1)[0].strip() or "-"
+
+
+def _bucket_start(when: datetime.datetime, width: int) -> str:
+    seconds = int(when.timestamp()) // width * width
+    return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _parse(value: str) -> datetime.datetime:
+    """ISO timestamp (with or without a trailing Z) as an aware UTC datetime."""
+    return datetime.datetime.fromisoformat(value.rstrip("Z")).replace(tzinfo=datetime.timezone.utc)
+
+
+def _percentiles(histogram: list, count: int) -> dict:
+    """Upper bound of the histogram bucket holding each percentile (None past the last bound)."""
+    result = {}
+    for p in PERCENTILES:
+        if not count:
+            result[f"p{p}"] = None
+            continue
+        rank = count * p / 100
+        seen = 0
+        for i, n in enumerate(histogram):
+            seen += n
+            if seen >= rank:
+                result[f"p{p}"] = LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else None
+                break
+    return result
+
+
+def _summary(bucket: dict) -> dict:
+    decisions = bucket["by_decision"]
+    blocked = decisions.get("BLOCK", 0) + decisions.get("QUARANTINE", 0)
+    count = bucket["latency_count"]
+    return {
+        "total": bucket["total"],
+        **{f"by_{field}": dict(bucket[f"by_{field}"]) for field in COUNTED_FIELDS},
+        "block_rate": round(blocked / bucket["total"], 4) if bucket["total"] else 0.0,
+        "latency_ms": {
+            "count": count,
+            "avg": round(bucket["latency_sum_ms"] / count, 1) if count else None,
+            **_percentiles(bucket["latency_ms"], count),
+        },
+    }
+
+
+class Rollups:
+    """Thread-safe per-minute/per-hour counters for logged decisions."""
+
+    def __init__(self, resolutions: dict = RESOLUTIONS):
+        self.resolutions = resolutions
+        self._buckets = {name: {} for name in resolutions}  # start -> bucket
+        self._lock = threading.Lock()
+        self.loading = False  # True while load() is replaying stored rows
+
+    def record(self, entry: dict, latency_ms: float = None, when: datetime.datetime = None, resolutions=None):
+        """Count one logged decision (entry as written to the log) in every resolution (or the named ones)."""
+        when = when or datetime.datetime.now(datetime.timezone.utc)
+        values = {
+            "decision": entry.get("decision") or "ALLOW",
+            "reason": _normalize_reason(entry.get("reason")),
+            "stopped_by": entry.get("stopped_by") or "-",
+            "attack_type": entry.get("attack_type") or None,
+        }
+        slot = None
+        if latency_ms is not None:
+            slot = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if latency_ms <= bound),
+                        len(LATENCY_BUCKETS_MS))
+
+        with self._lock:
+            for name, (width, keep) in self.resolutions.items():
+                if resolutions is not None and name not in resolutions:
+                    continue
+                buckets = self._buckets[name]
+                start = _bucket_start(when, width)
+                bucket = buckets.get(start)
+                if bucket is None:
+                    bucket = buckets[start] = _new_bucket()
+                    while len(buckets) > keep:
+                        del buckets[min(buckets)]  # Oldest by time, even if it arrived late
+
+                bucket["total"] += 1
+                for field, value in values.items():
+                    if value is not None:
+                        counts = bucket[f"by_{field}"]
+                        counts[value] = counts.get(value, 0) + 1
+                if slot is not None:
+                    bucket["latency_ms"][slot] += 1
+                    bucket["latency_count"] += 1
+                    bucket["latency_sum_ms"] += latency_ms
+
+    def load(self, rows, until: str = None):
+        """
+        Rebuild counts from stored rows (dicts with a "timestamp"), oldest first,
+        stopping after until. Each row only goes to the resolutions whose
+        retention still covers it, so minute buckets that would be evicted
+        straight away are never built.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cutoffs = {
+            name: now - datetime.timedelta(seconds=width * keep)
+            for name, (width, keep) in self.resolutions.items()
+        }
+        until = _parse(until) if until else None
+        self.loading = True
+        try:
+            for row in rows:
+                when = _parse(row["timestamp"])
+                if until is not None and when > until:
+                    break
+                names = [name for name, cutoff in cutoffs.items() if when >= cutoff]
+                if names:
+                    self.record(row, when=when, resolutions=names)
+        finally:
+            self.loading = False
+
+    def stats(self, resolution: str = "minute", since: str = None, until: str = None) -> dict:
+        """
+        Buckets of one resolution (oldest first) within [since, until], plus
+        totals merged across them. since/until are ISO timestamps.
+        """
+        if resolution not in self.resolutions:
+            raise ValueError(f"resolution must be one of {', '.join(self.resolutions)}")
+        width = self.resolutions[resolution][0]
+        if until and len(until) == 10:  # A bare date includes the whole day
+            until += "T23:59:59"
+        lower = _bucket_start(_parse(since), width) if since else None
+        upper = _bucket_start(_parse(until), 1) if until else None
+
+        with self._lock:
+            selected = [
+                (start, bucket) for start, bucket in sorted(self._buckets[resolution].items())
+                if (lower is None or start >= lower) and (upper is None or start <= upper)
+            ]
+            merged = _new_bucket()
+            for _, bucket in selected:
+                merged["total"] += bucket["total"]
+                for field in COUNTED_FIELDS:
+                    counts = merged[f"by_{field}"]
+                    for value, n in bucket[f"by_{field}"].items():
+                        counts[value] = counts.get(value, 0) + n
+                merged["latency_ms"] = [a + b for a, b in zip(merged["latency_ms"], bucket["latency_ms"])]
+                merged["latency_count"] += bucket["latency_count"]
+                merged["latency_sum_ms"] += bucket["latency_sum_ms"]
+            buckets = [{"start": start, **_summary(bucket)} for start, bucket in selected]
+
+        return {
+            "resolution": resolution,
+            "bucket_seconds": width,
+            "complete": not self.loading,  # False while stored history is still being replayed
+            "latency_buckets_ms": list(LATENCY_BUCKETS_MS),
+            "totals": _summary(merged),
+            "buckets": buckets,
+        }
@@ -0,0 +1,185 @@
+"""
+Rotation and tail reading for the CSV detection log.
+- rotate_segment: moves the live CSV into the segments directory, gzips it and
+  records its time range in segments.json, keeping its last rows uncompressed
+  alongside so tail reads never have to decompress it
+- tail_rows: the last N rows of a CSV, read backwards from the end of the
+  file, so the cost depends on N, not on how much history the file holds
+- recent_rows: last N rows across the live file and the newest segments
+"""
+
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import shutil
+from collections import deque
+from pathlib import Path
+
+TAIL_BLOCK_SIZE = 64 * 1024  # Bytes read per step when scanning backwards
+SEGMENT_TAIL_ROWS = 1000  # Last rows of each segment kept uncompressed for tail reads
+INDEX_NAME = "segments.json"
+
+
+# -------------------------
+# SEGMENT INDEX
+# -------------------------
+def load_index(segments_dir: Path) -> list:
+    """Segments oldest first: [{"file", "tail_file", "tail_complete", "start", "end", "bytes", "compressed_bytes"}]."""
+    path = Path(segments_dir) / INDEX_NAME
+    if not path.exists():
+        return []
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_index(segments_dir: Path, segments: list):
+    path = Path(segments_dir) / INDEX_NAME
+    tmp = path.with_suffix(".json.tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(segments, f, indent=2)
+    os.replace(tmp, path)  # Readers never see a half-written index
+
+
+def first_timestamp(path: Path, fieldnames: list):
+    """Timestamp of the first row of a CSV log, or None if it has no rows."""
+    if not Path(path).exists():
+        return None
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        row = next(reader, None)
+    return row["timestamp"] if row else None
+
+
+def parse_timestamp(value: str) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(value.rstrip("Z"))
+
+
+def rotate_segment(path: Path, segments_dir: Path, fieldnames: list, tail_size: int = SEGMENT_TAIL_ROWS) -> dict:
+    """
+    Move the CSV at path into segments_dir as a gzipped segment and index it.
+    The caller must have closed the file and starts a fresh one afterwards.
+    Returns the index entry, or None if the file had no rows.
+    """
+    path, segments_dir = Path(path), Path(segments_dir)
+    start = first_timestamp(path, fieldnames)
+    if start is None:
+        return None
+    last_rows = tail_rows(path, tail_size, fieldnames)
+    end = last_rows[-1]["timestamp"]
+
+    segments_dir.mkdir(parents=True, exist_ok=True)
+    stamp = parse_timestamp(start).strftime("%Y%m%dT%H%M%S")
+    target = segments_dir / f"{path.stem}-{stamp}.csv.gz"
+    suffix = 1
+    while target.exists():
+        target = segments_dir / f"{path.stem}-{stamp}-{suffix}.csv.gz"
+        suffix += 1
+
+    tail_target = target.with_name(target.name[:-len(".csv.gz")] + ".tail.csv")
+    with tail_target.open("w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(last_rows)
+
+    size = path.stat().st_size
+    with path.open("rb") as src, gzip.open(target, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    path.unlink()
+
+    entry = {
+        "file": target.name,
+        "tail_file": tail_target.name,
+        "tail_complete": len(last_rows) < tail_size,  # The tail file holds every row of the segment
+        "start": start,
+        "end": end,
+        "bytes": size,
+        "compressed_bytes": target.stat().st_size,
+    }
+    _save_index(segments_dir, load_index(segments_dir) + [entry])
+    return entry
+
+
+# -------------------------
+# TAIL READING
+# -------------------------
+def tail_rows(path: Path, n: int, fieldnames: list) -> list:
+    """
+    Last n rows of a CSV file (oldest first), found by scanning backwards.
+
+    Quoted fields may contain newlines, so a newline only ends a record if an
+    even number of quote characters follows it: the file ends outside any
+    quotes, and escaped quotes ("") come in pairs.
+    """
+    path = Path(path)
+    if n <= 0 or not path.exists():
+        return []
+
+    with path.open("rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        data = b""
+        pos = end
+        boundaries = 0  # Record-ending newlines seen so far (the final one included)
+        quotes = 0  # Quote characters between the scan position and EOF
+        cut = None
+        while pos > 0 and cut is None:
+            step = min(TAIL_BLOCK_SIZE, pos)
+            pos -= step
+            f.seek(pos)
+            block = f.read(step)
+            for i in range(len(block) - 1, -1, -1):
+                byte = block[i]
+                if byte == 0x22:  # '"'
+                    quotes += 1
+                elif byte == 0x0A and quotes % 2 == 0:  # '\n' outside quotes
+                    boundaries += 1
+                    if boundaries > n:
+                        cut = i + 1
+                        break
+            data = block + data
+        if cut is not None:
+            data = data[cut:]
+            at_start = False
+        else:
+            at_start = True
+
+    rows = list(csv.reader(io.StringIO(data.decode("utf-8"), newline="")))
+    if at_start and rows and rows[0] == fieldnames:
+        rows = rows[1:]  # The scan reached the header
+    return [dict(zip(fieldnames, row)) for row in rows[-n:]]
+
+
+def _segment_tail(path: Path, n: int, fieldnames: list) -> list:
+    """Last n rows of a gzipped segment, streamed (gzip can't seek from the end) keeping only n in memory."""
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # Header
+        return [dict(zip(fieldnames, row)) for row in deque(reader, maxlen=n)]
+
+
+def recent_rows(path: Path, segments_dir: Path, n: int, fieldnames: list) -> list:
+    """
+    Last n rows (newest first) from the live file, topped up from the
+    newest segments when the live file holds fewer than n. Segments are read
+    from their uncompressed tail files, so the cost depends on n only; a
+    segment without one (or asked for more rows than it kept) is decompressed
+    as a stream keeping only the rows still needed.
+    """
+    rows = tail_rows(path, n, fieldnames)
+    for entry in reversed(load_index(segments_dir)):
+        if len(rows) >= n:
+            break
+        needed = n - len(rows)
+        tail_file = Path(segments_dir) / entry["tail_file"] if entry.get("tail_file") else None
+        segment = Path(segments_dir) / entry["file"]
+        if tail_file is not None and tail_file.exists():
+            kept = tail_rows(tail_file, needed, fieldnames)
+            if len(kept) >= needed or entry.get("tail_complete") or not segment.exists():
+                rows = kept + rows
+                continue
+        if segment.exists():
+            rows = _segment_tail(segment, needed, fieldnames) + rows
+    return rows[::-1]
@@ -0,0 +1,154 @@
+"""
+Indexed store for the detection log.
+- Append-only SQLite table (WAL mode) next to detections.csv, written in
+  batches by the log writer thread
+- Indexed on timestamp, decision and stopped_by, so /logs reads only the
+  requested page instead of parsing the whole CSV
+- Keyset (cursor) pagination, newest first
+- On first use, rows already in detections.csv are imported
+- Also keeps the firewall attack type, which the CSV has no column for
+"""
+
+import csv
+import sqlite3
+import threading
+from pathlib import Path
+
+MAX_PAGE_SIZE = 1000
+IMPORT_BATCH = 5000  # CSV rows inserted per transaction during migration
+
+COLUMNS = ("timestamp", "query", "decision", "reason", "stopped_by", "attack_type")
+
+
+class LogStore:
+    """Thread-safe SQLite store for detection rows."""
+
+    def __init__(self, db_path: Path):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS detections (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                query TEXT NOT NULL,
+                decision TEXT NOT NULL,
+                reason TEXT NOT NULL,
+                stopped_by TEXT NOT NULL,
+                attack_type TEXT NOT NULL DEFAULT ''
+            )
+        """)
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(detections)")}
+        if "attack_type" not in existing:  # Stores created before attack types were kept
+            self._conn.execute("ALTER TABLE detections ADD COLUMN attack_type TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_detections_timestamp ON detections (timestamp)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_detections_decision ON detections (decision, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_detections_stopped_by ON detections (stopped_by, id)")
+        self._conn.commit()
+
+    def append(self, rows: list):
+        """Insert a batch of row dicts in one transaction."""
+        values = [tuple(row.get(c, "") or "" for c in COLUMNS) for row in rows]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO detections ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", values
+            )
+
+    def import_csv(self, csv_path: Path) -> int:
+        """Copy an existing CSV log into an empty store; returns rows imported."""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM detections LIMIT 1").fetchone():
+                return 0
+        if not Path(csv_path).exists():
+            return 0
+
+        imported = 0
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:
+            batch = []
+            for row in csv.DictReader(f):
+                batch.append(row)
+                if len(batch) >= IMPORT_BATCH:
+                    self.append(batch)
+                    imported += len(batch)
+                    batch = []
+            if batch:
+                self.append(batch)
+                imported += len(batch)
+        return imported
+
+    def iter_rows_since(self, since: str):
+        """
+        Yield every row logged at or after since (oldest first), one at a time.
+        Uses its own read connection (WAL lets it run alongside writes), so a
+        long scan neither holds the store lock nor loads all rows into memory.
+        """
+        conn = sqlite3.connect(str(self.db_path))
+        conn.row_factory = sqlite3.Row
+        try:
+            cursor = conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM detections WHERE timestamp >= ? ORDER BY timestamp", (since,)
+            )
+            for row in cursor:
+                yield dict(row)
+        finally:
+            conn.close()
+
+    def query(self, since=None, until=None, decision=None, stopped_by=None, limit=100, cursor=None,
+              aggregates=False) -> dict:
+        """
+        One page of rows matching the filters, newest first.
+        Pass the returned next_cursor back as cursor for the following page.
+        With aggregates=True (first page only), also counts every matching row
+        by decision and stopped_by; that scans the whole filtered range, so it
+        is opt-in rather than paid on every page.
+        """
+        where, params = [], []
+        if since:
+            where.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            where.append("timestamp <= ?")
+            params.append(until)
+        if decision:
+            where.append("decision = ?")
+            params.append(decision)
+        if stopped_by:
+            where.append("stopped_by = ?")
+            params.append(stopped_by)
+        filters = " AND ".join(where) or "1"
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+        page_filters, page_params = filters, list(params)
+        if cursor is not None:
+            page_filters += " AND id < ?"
+            page_params.append(int(cursor))
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, {', '.join(COLUMNS)} FROM detections WHERE {page_filters} ORDER BY id DESC LIMIT ?",
+                page_params + [limit]
+            ).fetchall()
+            summary = None
+            if aggregates and cursor is None:
+                by_decision = self._conn.execute(
+                    f"SELECT decision, COUNT(*) FROM detections WHERE {filters} GROUP BY decision", params
+                ).fetchall()
+                by_stopped_by = self._conn.execute(
+                    f"SELECT stopped_by, COUNT(*) FROM detections WHERE {filters} GROUP BY stopped_by", params
+                ).fetchall()
+                decisions = {d: n for d, n in by_decision}
+                summary = {
+                    "total": sum(decisions.values()),
+                    "by_decision": decisions,
+                    "by_stopped_by": {s: n for s, n in by_stopped_by},
+                }
+
+        return {
+            "logs": [dict(row) for row in rows],
+            "next_cursor": rows[-1]["id"] if len(rows) == limit else None,
+            "aggregates": summary,
+        }
@@ -1,19 +1,178 @@
 from pathlib import Path
-import csv, json, time, datetime, threading
-from queue import Queue, Empty
+import csv, json, time, datetime, threading, os, atexit
+from queue import Queue, Empty, Full
+
+from backend.services import log_segments
+from backend.services.log_rollups import Rollups
+from backend.services.log_store import LogStore
+from backend.utils.broadcast import Broadcaster
 
 LOG_DIR = Path("logs")
 LOG_FILE = LOG_DIR / "detections.csv"
-queue = Queue()
+LOG_DB = LOG_DIR / "detections.db"  # Indexed copy of the CSV that /logs queries
+LOG_SEGMENTS_DIR = LOG_DIR / "segments"  # Rotated, gzipped CSV segments + segments.json
+LOG_FIELDS = ["timestamp", "query", "decision", "reason", "stopped_by"]
+
+# Live decisions for /stream: every subscriber gets every event
+STREAM_BUFFER_SIZE = 256  # Events buffered per subscriber; a slow one loses its oldest
+STREAM_HISTORY_SIZE = 1000  # Recent events kept for Last-Event-ID resume
+STREAM_HEARTBEAT = 15  # Seconds between keep-alive comments on an idle stream
+_events = Broadcaster(STREAM_BUFFER_SIZE, STREAM_HISTORY_SIZE)
+
+# Detection rows are written by one background thread, not the request thread
+LOG_QUEUE_SIZE = 10000  # Rows waiting to be written; beyond this new rows are dropped (and counted)
+LOG_BATCH_SIZE = 200  # Rows written per batch at most
+LOG_FLUSH_INTERVAL = 1.0  # Seconds a row may wait before its batch is flushed
+LOG_FSYNC = "interval"  # "always" (every batch), "interval" (every LOG_FSYNC_INTERVAL) or "never"
+LOG_FSYNC_INTERVAL = 5.0  # Seconds between fsyncs when LOG_FSYNC == "interval"
+LOG_ROTATE_BYTES = 50 * 1024 * 1024  # Rotate detections.csv once it reaches this size...
+LOG_ROTATE_SECONDS = 24 * 3600  # ...or once its first row is this old
+MAX_TAIL_ROWS = 1000
+ROLLUP_REBUILD_HOURS = 30 * 24  # History replayed into the rollups at startup (hourly retention)
+
+_write_queue = Queue(maxsize=LOG_QUEUE_SIZE)
+_writer_thread = None
+_writer_lock = threading.Lock()
+_writer_stats = {"written": 0, "dropped": 0, "batches": 0, "fsyncs": 0, "errors": 0, "rotations": 0}
+_STOP = object()
+_file_lock = threading.Lock()  # Held while the writer appends or rotates, so tail reads see whole rows
+
+# Per-minute/hour analytics, updated on every logged decision
+_rollups = Rollups()
+
+_store = None
+_store_lock = threading.Lock()
+
+def _get_store():
+    """Open the log store on first use, importing any rows already in the CSV."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            store = LogStore(LOG_DB)
+            imported = store.import_csv(LOG_FILE)
+            if imported:
+                print(f"[logging] Imported {imported} rows from {LOG_FILE} into {LOG_DB}")
+            _store = store
+        return _store
 
 def init_logs():
     LOG_DIR.mkdir(exist_ok=True)
     if not LOG_FILE.exists():
         with LOG_FILE.open("w", newline="", encoding="utf-8") as f:
             writer = csv.writer(f)
-            writer.writerow(["timestamp", "query", "decision", "reason", "stopped_by"])
+            writer.writerow(LOG_FIELDS)
 
-def log_decision(query, result):
+def _next_batch():
+    """Block for the first row, then collect more until the batch is full or the interval is up."""
+    batch = [_write_queue.get()]
+    deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+    while len(batch) < LOG_BATCH_SIZE and batch[-1] is not _STOP:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_write_queue.get(timeout=remaining))
+        except Empty:
+            break
+    return batch
+
+def _segment_age(first_timestamp):
+    """Seconds since the first row of the live file was written (0 if it has none)."""
+    if first_timestamp is None:
+        return 0
+    return (datetime.datetime.utcnow() - log_segments.parse_timestamp(first_timestamp)).total_seconds()
+
+def _rotate():
+    """Close out the live CSV as a gzipped segment and start a new one (writer thread only)."""
+    entry = log_segments.rotate_segment(LOG_FILE, LOG_SEGMENTS_DIR, LOG_FIELDS, MAX_TAIL_ROWS)
+    init_logs()
+    if entry:
+        _writer_stats["rotations"] += 1
+        print(f"[logging] Rotated {LOG_FILE} -> {LOG_SEGMENTS_DIR / entry['file']} "
+              f"({entry['start']} .. {entry['end']})")
+
+def _open_log():
+    """Open the live CSV for appending (creating it with a header if needed)."""
+    init_logs()
+    f = LOG_FILE.open("a", newline="", encoding="utf-8")
+    return f, csv.DictWriter(f, fieldnames=LOG_FIELDS, extrasaction="ignore")
+
+def _writer_loop():
+    init_logs()
+    store = _get_store()  # Import existing CSV rows before appending new ones
+    last_fsync = time.monotonic()
+    segment_start = log_segments.first_timestamp(LOG_FILE, LOG_FIELDS)
+    f, writer = _open_log()
+    while True:
+        batch = _next_batch()
+        stop = batch[-1] is _STOP
+        rows = [row for row in batch if row is not _STOP]
+        try:
+            with _file_lock:
+                if f.closed:  # Reopening after a failed rotation failed too; try again
+                    f, writer = _open_log()
+                writer.writerows(rows)
+                f.flush()
+                now = time.monotonic()
+                if LOG_FSYNC == "always" or (LOG_FSYNC == "interval" and now - last_fsync >= LOG_FSYNC_INTERVAL) \
+                        or (stop and LOG_FSYNC != "never"):
+                    os.fsync(f.fileno())
+                    last_fsync = now
+                    _writer_stats["fsyncs"] += 1
+                _writer_stats["written"] += len(rows)
+                _writer_stats["batches"] += 1
+                if segment_start is None and rows:
+                    segment_start = rows[0]["timestamp"]
+
+                if f.tell() >= LOG_ROTATE_BYTES or _segment_age(segment_start) >= LOG_ROTATE_SECONDS:
+                    f.close()
+                    try:
+                        _rotate()
+                        segment_start = None
+                    except Exception as e:
+                        _writer_stats["errors"] += 1
+                        print(f"[logging] Failed to rotate {LOG_FILE}: {e}")
+                    finally:
+                        # Keep writing to the live file even if the rotation failed (it is retried next batch)
+                        f, writer = _open_log()
+        except Exception as e:
+            _writer_stats["errors"] += 1
+            print(f"[logging] Failed to write {len(rows)} detection rows: {e}")
+        try:
+            store.append(rows)
+        except Exception as e:
+            _writer_stats["errors"] += 1
+            print(f"[logging] Failed to index {len(rows)} detection rows: {e}")
+        if stop:
+            f.close()
+            return
+
+def _ensure_writer():
+    """Start the writer thread on first use, or again if it has died."""
+    global _writer_thread
+    if _writer_thread is not None and _writer_thread.is_alive():
+        return
+    with _writer_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            if _writer_thread is None:
+                atexit.register(flush_logs)
+            _writer_thread = threading.Thread(target=_writer_loop, name="detection-log-writer", daemon=True)
+            _writer_thread.start()
+
+def flush_logs(timeout=5.0):
+    """Write out everything queued and stop the writer (called at exit)."""
+    global _writer_thread
+    with _writer_lock:
+        thread, _writer_thread = _writer_thread, None
+    if thread is None:
+        return
+    _write_queue.put(_STOP)
+    thread.join(timeout)
+
+def get_log_writer_stats():
+    return {**_writer_stats, "queued": _write_queue.qsize(), "queue_size": LOG_QUEUE_SIZE}
+
+def log_decision(query, result, latency_ms=None):
     entry = {
         "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
         "query": query,
@@ -22,25 +181,59 @@ def log_decision(query, result):
         "stopped_by": result.get("stopped_by", "-"),
     }
 
-    with LOG_FILE.open("a", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=entry.keys())
-        writer.writerow(entry)
+    # The attack type goes to the store and rollups only; the CSV keeps its original columns
+    row = {**entry, "attack_type": result.get("attack_type") or ""}
+    _rollups.record(row, latency_ms)
 
-    queue.put(json.dumps(entry))
+    # Never block the query path on disk: hand the row to the writer thread
+    _ensure_writer()
+    try:
+        _write_queue.put_nowait(row)
+    except Full:
+        _writer_stats["dropped"] += 1
 
-def stream_logs():
-    while True:
-        try:
-            data = queue.get(timeout=15)
-            yield f"data: {data}\n\n"
-        except Empty:
+    _events.publish(json.dumps(entry))
+
+def stream_logs(last_event_id=None):
+    """SSE stream of decisions; resumes after last_event_id when the client sends one."""
+    yield "retry: 3000\n\n"
+    for event in _events.subscribe(last_event_id, heartbeat=STREAM_HEARTBEAT):
+        if event is None:
             yield ": heartbeat\n\n"
+        else:
+            event_id, data = event
+            yield f"id: {event_id}\ndata: {data}\n\n"
 
-def get_logs():
-    if not LOG_FILE.exists():
-        return []
-    with LOG_FILE.open("r", encoding="utf-8") as f:
-        return list(csv.DictReader(f))
+def get_stream_stats():
+    return _events.get_stats()
+
+def get_logs(since=None, until=None, decision=None, stopped_by=None, limit=100, cursor=None, aggregates=False):
+    """One page of logged decisions (newest first) with next_cursor, and aggregates if asked for."""
+    return _get_store().query(since, until, decision, stopped_by, limit, cursor, aggregates)
+
+def tail_logs(n=100):
+    """Last n logged decisions, newest first, read from the end of the log files."""
+    n = max(1, min(int(n), MAX_TAIL_ROWS))
+    with _file_lock:
+        return log_segments.recent_rows(LOG_FILE, LOG_SEGMENTS_DIR, n, LOG_FIELDS)
+
+def get_log_segments():
+    """Rotated segments, oldest first, with the time range each one covers."""
+    return log_segments.load_index(LOG_SEGMENTS_DIR)
+
+def get_log_stats(resolution="minute", since=None, until=None):
+    """Pre-aggregated counts, block rate and latency percentiles per minute or hour."""
+    return _rollups.stats(resolution, since, until)
 
 def start_log_poller():
     init_logs()
+    store = _get_store()
+    # Rebuild counts (attack types included) for the retention window in the background,
+    # streamed row by row; decisions logged from now on are counted live, so the replay
+    # stops at this moment. Latencies are not stored, so those start empty
+    now = datetime.datetime.utcnow()
+    cutoff = now - datetime.timedelta(hours=ROLLUP_REBUILD_HOURS)
+    rows = store.iter_rows_since(cutoff.isoformat() + "Z")
+    threading.Thread(
+        target=_rollups.load, args=(rows, now.isoformat() + "Z"), name="rollup-rebuild", daemon=True
+    ).start()
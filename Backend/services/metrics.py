@@ -0,0 +1,206 @@
+"""
+Query pipeline observability.
+- Per-stage latency histograms and query counters, rendered in the Prometheus
+  text format for /metrics (no client library needed)
+- Any stats dict (firewall, caches, admission) can be exported alongside them
+- Sampled, non-blocking debug logging: only a fraction of requests log their
+  debug lines, and records go through a bounded queue to a listener thread,
+  so a slow console never stalls a request
+"""
+
+import contextvars
+import logging
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+# -------------------------
+# CONFIG
+# -------------------------
+METRIC_PREFIX = "zerosec"
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)  # Seconds
+
+DEBUG_SAMPLE_RATE = 0.05  # Fraction of requests whose debug lines are logged
+DEBUG_LOG_QUEUE_SIZE = 1000  # Debug records buffered before new ones are dropped
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Thread-safe cumulative histogram with optional labels."""
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=STAGE_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues):
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for labelvalues, (counts, total, count) in sorted(series.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.labelnames, labelvalues, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            labels = _format_labels(self.labelnames, labelvalues, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {total:.6f}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Counter:
+    """Thread-safe monotonically increasing counter with optional labels."""
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for labelvalues, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    f"{METRIC_PREFIX}_stage_seconds",
+    "Time spent in each query pipeline stage",
+    labelnames=("stage",)
+)
+QUERIES = Counter(
+    f"{METRIC_PREFIX}_queries_total",
+    "Queries answered, by endpoint and decision",
+    labelnames=("endpoint", "decision")
+)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Record how long the block takes under the given stage name."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage)
+
+
+def record_query(endpoint: str, result: dict):
+    QUERIES.inc(endpoint, result.get("decision", "ALLOW"))
+
+
+# -------------------------
+# EXPORT
+# -------------------------
+def _metric_name(*parts) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", "_".join(p for p in parts if p))
+
+
+def _render_stats(prefix: str, stats: dict) -> list:
+    """Numeric values of a (nested) stats dict as gauges; other values are skipped."""
+    lines = []
+    for key, value in stats.items():
+        name = _metric_name(prefix, key)
+        if isinstance(value, dict):
+            lines.extend(_render_stats(name, value))
+        elif isinstance(value, (bool, int, float)):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {float(value)}")
+    return lines
+
+
+def render_metrics(stats: dict = None) -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    stats maps a name to a stats dict (e.g. {"firewall": firewall.get_stats()}).
+    """
+    lines = STAGE_SECONDS.render() + QUERIES.render()
+    for name, values in (stats or {}).items():
+        lines.extend(_render_stats(_metric_name(METRIC_PREFIX, name), values))
+    lines.extend(_render_stats(_metric_name(METRIC_PREFIX, "debug_log"), {"dropped": _debug_handler.dropped}))
+    return "\n".join(lines) + "\n"
+
+
+# -------------------------
+# SAMPLED DEBUG LOGGING
+# -------------------------
+class _DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_debug_queue = queue.Queue(maxsize=DEBUG_LOG_QUEUE_SIZE)
+_debug_handler = _DroppingQueueHandler(_debug_queue)
+_debug_logger = logging.getLogger("zerosec.debug")
+_debug_logger.setLevel(logging.DEBUG)
+_debug_logger.propagate = False
+_debug_logger.addHandler(_debug_handler)
+
+_console = logging.StreamHandler(sys.stdout)
+_console.setFormatter(logging.Formatter("%(message)s"))
+_debug_listener = QueueListener(_debug_queue, _console)
+_debug_listener.start()
+
+# Whether the current request was sampled for debug logging. Stage threads
+# inherit it because run_stage copies the caller's context.
+_debug_sampled = contextvars.ContextVar("debug_sampled", default=False)
+
+
+def sample_debug(enabled: bool = True) -> bool:
+    """Decide whether the current request logs debug lines; returns the decision."""
+    sampled = enabled and random.random() < DEBUG_SAMPLE_RATE
+    _debug_sampled.set(sampled)
+    return sampled
+
+
+def debug_enabled() -> bool:
+    return _debug_sampled.get()
+
+
+def debug_log(message: str, *args):
+    """Log a debug line if the current request was sampled."""
+    if _debug_sampled.get():
+        _debug_logger.debug(message, *args)
@@ -1,5 +1,14 @@
+import json
+import time
+import httpx
 import ollama
-from backend.rag.retriever import build_retriever, retrieve_with_scores, _ensure_vectorstore
+from backend.rag.retriever import (
+    build_retriever,
+    retrieve_with_scores,
+    _ensure_vectorstore,
+    embed_query,
+    get_index_generation,
+)
 from backend.rag.prompt_builder import (
     build_safe_context,
     build_prompt,
@@ -9,6 +18,10 @@ from backend.rag.prompt_builder import (
     preprocess_query
 )
 from backend.security import firewall
+from backend.services.answer_cache import SemanticAnswerCache
+from backend.services.admission import AdmissionController, StageTimeoutError, run_stage, get_stage_stats
+from backend.services.metrics import STAGE_SECONDS, stage_timer, sample_debug, debug_enabled, debug_log
+from backend.utils.singleflight import SingleFlight
 
 # -------------------------
 # LLM CONFIG - Optimized for RAG
@@ -22,9 +35,41 @@ LLM_OPTIONS = {
     "repeat_penalty": 1.15,  # Reduce repetition
 }
 
-# Debug mode - set to True to see prompts being sent to LLM
+# Debug mode - set to True to log prompts sent to the LLM for a sample of
+# requests (see metrics.DEBUG_SAMPLE_RATE)
 DEBUG_RAG = True
 
+# Semantic answer cache - reuse answers to equivalent questions over the same chunks
+ANSWER_CACHE_BUCKETS = 512  # Distinct (chunk set, model, options) combinations kept
+ANSWER_CACHE_TTL = 600  # Seconds an answer stays reusable
+ANSWER_CACHE_SIMILARITY = 0.97  # Minimum cosine similarity between question embeddings
+
+# Admission control - protect the single local Ollama instance under load
+MAX_INFLIGHT_GENERATIONS = 2  # LLM generations running at once
+MAX_QUEUED_GENERATIONS = 16  # Requests waiting for a slot before new ones get 429
+QUEUE_WAIT_TIMEOUT = 30  # Seconds a request may wait for a slot before it gets 503
+
+# Per-stage time budgets (seconds)
+FIREWALL_TIMEOUT = 5
+RETRIEVAL_TIMEOUT = 15
+GENERATION_TIMEOUT = 120  # Enforced by the Ollama client on each read
+
+_llm_client = ollama.Client(timeout=GENERATION_TIMEOUT)
+_admission = AdmissionController(
+    max_in_flight=MAX_INFLIGHT_GENERATIONS,
+    max_waiting=MAX_QUEUED_GENERATIONS,
+    wait_timeout=QUEUE_WAIT_TIMEOUT
+)
+
+# Identical concurrent questions share one pipeline run
+_inflight = SingleFlight()
+
+_answer_cache = SemanticAnswerCache(
+    max_buckets=ANSWER_CACHE_BUCKETS,
+    ttl=ANSWER_CACHE_TTL,
+    min_similarity=ANSWER_CACHE_SIMILARITY
+)
+
 # Conversational patterns that should skip RAG
 GREETING_PATTERNS = [
     "hello", "hi", "hey", "good morning", "good afternoon", "good evening",
@@ -43,24 +88,49 @@ def is_conversational(text: str) -> bool:
             return True
     return False
 
+def _answer_cache_key(results_with_scores):
+    """Everything besides the question wording that determines the LLM answer."""
+    chunk_ids = tuple(sorted(doc.id or "" for doc, _ in results_with_scores))
+    return (chunk_ids, LLM_MODEL, json.dumps(LLM_OPTIONS, sort_keys=True))
+
+
+def get_answer_cache_stats() -> dict:
+    """Get semantic answer cache statistics."""
+    return _answer_cache.get_stats()
+
+
+def get_inflight_stats() -> dict:
+    """Get single-flight deduplication statistics."""
+    return _inflight.get_stats()
+
+
+def get_admission_stats() -> dict:
+    """Get generation admission-control and stage-pool statistics."""
+    return {**_admission.get_stats(), "stage_pool": get_stage_stats()}
+
+
 def refresh_retriever():
     """Force refresh retriever (call after document changes)."""
     _ensure_vectorstore(force_reload=True)
 
 
-def query_rag(question: str) -> dict:
+def _prepare_generation(question: str):
     """
-    Optimized RAG pipeline:
+    Everything in the RAG pipeline up to the LLM call:
     1. Input validation & security
     2. Query preprocessing
     3. Semantic retrieval with relevance filtering
     4. Context building with deduplication
-    5. LLM generation with optimized params
-    6. Output security & PII filtering
+    5. PII enforcement and answer-cache lookup
+    Returns (result, plan): result is a final response when no generation is
+    needed, otherwise plan holds what the LLM call and answer cache need.
+    Raises StageTimeoutError if the firewall or retrieval stage runs too long.
     """
+    sample_debug(DEBUG_RAG)
+
     # Validate input
     if not question or not question.strip():
-        return {"decision": "BLOCK", "reason": "empty_query", "sources": []}
+        return {"decision": "BLOCK", "reason": "empty_query", "sources": []}, None
 
     question = question.strip()
 
@@ -70,19 +140,27 @@ def query_rag(question: str) -> dict:
             "decision": "ALLOW",
             "answer": "Hello! I'm your RAG assistant. Ask me questions about your documents and I'll help you find information.",
             "sources": []
-        }
+        }, None
 
     # 1. Input firewall
-    inj, score = firewall.detect_injection(question)
+    with stage_timer("firewall"):
+        inj, score = run_stage("firewall", FIREWALL_TIMEOUT, firewall.detect_injection, question)
     if inj:
-        return {"decision": "BLOCK", "reason": "prompt_injection", "sources": []}
+        return {
+            "decision": "BLOCK",
+            "reason": "prompt_injection",
+            "attack_type": firewall.detect_attack(question),
+            "sources": []
+        }, None
 
     # 2. Preprocess query for better retrieval
-    processed_query = preprocess_query(question)
+    with stage_timer("preprocess"):
+        processed_query = preprocess_query(question)
 
     # 3. Retrieve relevant chunks with relevance filtering
     # Only returns documents above the relevance threshold
-    results_with_scores = retrieve_with_scores(processed_query)
+    with stage_timer("retrieval"):
+        results_with_scores = run_stage("retrieval", RETRIEVAL_TIMEOUT, retrieve_with_scores, processed_query)
 
     # If no relevant documents found, respond without RAG context
     if not results_with_scores:
@@ -90,13 +168,14 @@ def query_rag(question: str) -> dict:
             "decision": "ALLOW",
             "answer": "I don't have specific information about that in my documents. How can I help you?",
             "sources": []
-        }
+        }, None
 
     # Extract just the documents for context building
     docs = [doc for doc, score in results_with_scores]
 
     # 4. Build safe context and get actually used sources
-    context, used_sources = build_safe_context(docs)
+    with stage_timer("context_build"):
+        context, used_sources = run_stage("firewall", FIREWALL_TIMEOUT, build_safe_context, docs)
 
     # Add relevance scores to sources for transparency
     source_scores = {doc.metadata.get('filename', ''): score for doc, score in results_with_scores}
@@ -110,64 +189,189 @@ def query_rag(question: str) -> dict:
             "decision": "ALLOW",
             "answer": "I found some documents but couldn't extract usable information. Please try rephrasing your question.",
             "sources": []
-        }
+        }, None
 
-    # 5. Build prompt
+    # 5. PII enforcement - the answer is fixed, so don't spend an LLM call on it
+    entities = extract_entities_from_question(question)
+    subject = extract_subject_name(question)
+
+    if entities and subject:
+        return {
+            "decision": "ALLOW",
+            "answer": f"{subject}'s {entities[0]} is <REDACTED>",
+            "sources": used_sources
+        }, None
+
+    # Reuse the sanitized answer to an equivalent question over the same chunks
+    cache_key = _answer_cache_key(results_with_scores)
+    generation = get_index_generation()
+    try:
+        question_embedding = run_stage("retrieval", RETRIEVAL_TIMEOUT, embed_query, processed_query)
+    except Exception:
+        question_embedding = None  # Embedding unavailable - skip the answer cache
+
+    if question_embedding is not None:
+        answer = _answer_cache.get(cache_key, generation, question_embedding)
+        if answer is not None:
+            debug_log("[RAG DEBUG] Answer cache hit")
+            return {"decision": "ALLOW", "answer": answer, "sources": used_sources}, None
+
+    # 6. Build prompt
     prompt = build_prompt(context, question)
 
-    # Debug: Print what we're sending to the LLM
-    if DEBUG_RAG:
-        print(f"\n{'='*60}")
-        print(f"[RAG DEBUG] Question: {question}")
-        print(f"[RAG DEBUG] Context length: {len(context)} chars")
-        print(f"[RAG DEBUG] Number of sources: {len(used_sources)}")
-        print(f"[RAG DEBUG] Prompt being sent:")
-        print(f"{'-'*40}")
-        print(prompt[:1500] + "..." if len(prompt) > 1500 else prompt)
-        print(f"{'='*60}\n")
+    # Debug: Log what we're sending to the LLM (sampled requests only)
+    if debug_enabled():
+        debug_log(f"\n{'='*60}")
+        debug_log(f"[RAG DEBUG] Question: {question}")
+        debug_log(f"[RAG DEBUG] Context length: {len(context)} chars")
+        debug_log(f"[RAG DEBUG] Number of sources: {len(used_sources)}")
+        debug_log("[RAG DEBUG] Prompt being sent:")
+        debug_log(f"{'-'*40}")
+        debug_log(prompt[:1500] + "..." if len(prompt) > 1500 else prompt)
+        debug_log(f"{'='*60}\n")
 
     # Note: Skip firewall check on internally-built prompt (only check user input)
 
-    # 6. LLM call with optimized parameters
-    try:
-        response = ollama.generate(
-            model=LLM_MODEL,
-            prompt=prompt,
-            options=LLM_OPTIONS
-        )
-        raw_answer = response.get("response", "")
+    return None, {
+        "prompt": prompt,
+        "sources": used_sources,
+        "cache_key": cache_key,
+        "generation": generation,
+        "question_embedding": question_embedding,
+    }
+
+
+def _finish_generation(plan: dict, raw_answer: str) -> dict:
+    """Clean, sanitize and cache a generated answer."""
+    with stage_timer("output_sanitize"):
         answer = clean_rag_output(raw_answer)
+        safe_answer = firewall.sanitize_text(answer)
 
-        if DEBUG_RAG:
-            print(f"[RAG DEBUG] Raw LLM response: {raw_answer[:500]}...")
-            print(f"[RAG DEBUG] Cleaned answer: {answer[:500]}...")
-    except Exception as e:
-        return {
-            "decision": "BLOCK",
-            "reason": f"llm_error: {str(e)}",
-            "sources": used_sources
-        }
+    if debug_enabled():
+        debug_log(f"[RAG DEBUG] Raw LLM response: {raw_answer[:500]}...")
+        debug_log(f"[RAG DEBUG] Cleaned answer: {answer[:500]}...")
 
     if not answer:
         return {
             "decision": "ALLOW",
             "answer": "I was unable to generate a response. Please try again.",
-            "sources": used_sources
+            "sources": plan["sources"]
         }
 
-    # 7. PII enforcement
-    entities = extract_entities_from_question(question)
-    subject = extract_subject_name(question)
-
-    if entities and subject:
-        return {
-            "decision": "ALLOW",
-            "answer": f"{subject}'s {entities[0]} is <REDACTED>",
-            "sources": used_sources
-        }
+    answer = safe_answer
+    if plan["question_embedding"] is not None:
+        _answer_cache.put(plan["cache_key"], plan["generation"], plan["question_embedding"], answer)
 
     return {
         "decision": "ALLOW",
-        "answer": firewall.sanitize_text(answer),
-        "sources": used_sources
+        "answer": answer,
+        "sources": plan["sources"]
     }
+
+
+def query_rag(question: str) -> dict:
+    """
+    Answer a question. Concurrent calls with the same question (ignoring case
+    and whitespace) against the same index generation share one run of the
+    pipeline, and each caller gets its own copy of the result.
+    """
+    key = (" ".join((question or "").lower().split()), get_index_generation())
+    return _inflight.do(key, _run_query, question)
+
+
+def _run_query(question: str) -> dict:
+    """
+    Optimized RAG pipeline:
+    1. Input validation & security
+    2. Query preprocessing
+    3. Semantic retrieval with relevance filtering
+    4. Context building with deduplication
+    5. PII enforcement (or a cached equivalent answer)
+    6. LLM generation with optimized params
+    7. Output security filtering
+    See stream_query_rag for the token-streaming variant.
+    Raises OverloadedError when no generation slot is available and
+    StageTimeoutError when a stage exceeds its time budget.
+    """
+    result, plan = _prepare_generation(question)
+    if result is not None:
+        return result
+
+    # 6. LLM call with optimized parameters, once a generation slot is free
+    with _admission.slot():
+        try:
+            with stage_timer("llm_generate"):
+                response = _llm_client.generate(
+                    model=LLM_MODEL,
+                    prompt=plan["prompt"],
+                    options=LLM_OPTIONS
+                )
+            raw_answer = response.get("response", "")
+        except httpx.TimeoutException:
+            raise StageTimeoutError("generation", GENERATION_TIMEOUT) from None
+        except Exception as e:
+            return {
+                "decision": "BLOCK",
+                "reason": f"llm_error: {str(e)}",
+                "sources": plan["sources"]
+            }
+
+    return _finish_generation(plan, raw_answer)
+
+
+def stream_query_rag(question: str):
+    """
+    Streaming variant of query_rag.
+    Yields ("token", text) events as the LLM generates, then one ("done", result)
+    event with the same result query_rag would return. Tokens pass through a
+    StreamingSanitizer, so secrets are redacted before they leave the server even
+    when split across tokens; the final answer is also cleaned of LLM artifacts.
+    OverloadedError and StageTimeoutError are raised before the first event;
+    a generation timeout after tokens were sent ends the stream with a BLOCK.
+    """
+    result, plan = _prepare_generation(question)
+    if result is not None:
+        if result.get("answer"):
+            yield "token", result["answer"]
+        yield "done", result
+        return
+
+    sanitizer = firewall.StreamingSanitizer()
+    raw_parts = []
+    with _admission.slot(), stage_timer("llm_generate"):
+        started = time.perf_counter()
+        try:
+            for part in _llm_client.generate(
+                model=LLM_MODEL,
+                prompt=plan["prompt"],
+                options=LLM_OPTIONS,
+                stream=True
+            ):
+                token = part.get("response", "")
+                if not raw_parts:
+                    STAGE_SECONDS.observe(time.perf_counter() - started, "llm_first_token")
+                raw_parts.append(token)
+                safe = sanitizer.feed(token)
+                if safe:
+                    yield "token", safe
+        except httpx.TimeoutException:
+            if not raw_parts:
+                raise StageTimeoutError("generation", GENERATION_TIMEOUT) from None
+            yield "done", {
+                "decision": "BLOCK",
+                "reason": "generation_timeout",
+                "sources": plan["sources"]
+            }
+            return
+        except Exception as e:
+            yield "done", {
+                "decision": "BLOCK",
+                "reason": f"llm_error: {str(e)}",
+                "sources": plan["sources"]
+            }
+            return
+
+    safe = sanitizer.flush()
+    if safe:
+        yield "token", safe
+    yield "done", _finish_generation(plan, "".join(raw_parts))
@@ -0,0 +1,58 @@
+"""SemanticAnswerCache similarity matching, generation invalidation and TTL."""
+
+from backend.services import answer_cache
+from backend.services.answer_cache import SemanticAnswerCache
+
+BUCKET = ("chunk-1", "chunk-2", "llama3")
+
+
+def test_reuses_answer_for_similar_question():
+    cache = SemanticAnswerCache(min_similarity=0.97)
+    cache.put(BUCKET, 1, [1.0, 0.0, 0.0], "answer")
+    assert cache.get(BUCKET, 1, [2.0, 0.05, 0.0]) == "answer"  # Scale doesn't matter
+    assert cache.hits == 1
+
+
+def test_misses_dissimilar_question_and_other_bucket():
+    cache = SemanticAnswerCache(min_similarity=0.97)
+    cache.put(BUCKET, 1, [1.0, 0.0, 0.0], "answer")
+    assert cache.get(BUCKET, 1, [0.0, 1.0, 0.0]) is None
+    assert cache.get(("other",), 1, [1.0, 0.0, 0.0]) is None
+    assert cache.misses == 2
+
+
+def test_new_generation_drops_every_answer():
+    cache = SemanticAnswerCache()
+    cache.put(BUCKET, 1, [1.0, 0.0], "old")
+    assert cache.get(BUCKET, 2, [1.0, 0.0]) is None
+    assert cache.get_stats()["buckets"] == 0
+    # Going back to the old generation doesn't bring the answer back either
+    assert cache.get(BUCKET, 1, [1.0, 0.0]) is None
+
+
+def test_put_under_new_generation_invalidates_old_answers():
+    cache = SemanticAnswerCache()
+    cache.put(("a",), 1, [1.0, 0.0], "old")
+    cache.put(("b",), 2, [1.0, 0.0], "new")
+    assert cache.get(("a",), 2, [1.0, 0.0]) is None
+    assert cache.get(("b",), 2, [1.0, 0.0]) == "new"
+
+
+def test_answers_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(answer_cache.time, "monotonic", lambda: now[0])
+    cache = SemanticAnswerCache(ttl=60)
+    cache.put(BUCKET, 1, [1.0, 0.0], "answer")
+    now[0] += 59
+    assert cache.get(BUCKET, 1, [1.0, 0.0]) == "answer"
+    now[0] += 2
+    assert cache.get(BUCKET, 1, [1.0, 0.0]) is None
+
+
+def test_bucket_keeps_most_recent_questions():
+    cache = SemanticAnswerCache(bucket_size=2)
+    cache.put(BUCKET, 1, [1.0, 0.0, 0.0], "first")
+    cache.put(BUCKET, 1, [0.0, 1.0, 0.0], "second")
+    cache.put(BUCKET, 1, [0.0, 0.0, 1.0], "third")
+    assert cache.get(BUCKET, 1, [1.0, 0.0, 0.0]) is None
+    assert cache.get(BUCKET, 1, [0.0, 0.0, 1.0]) == "third"
@@ -0,0 +1,85 @@
+"""LRUCache eviction order, TTL expiry and counters."""
+
+from backend.utils import cache
+from backend.utils.cache import LRUCache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_evicts_least_recently_used():
+    lru = LRUCache(maxsize=2)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    assert lru.get("a") == 1  # "b" is now the least recently used
+    lru.put("c", 3)
+    assert lru.get("b") is None
+    assert lru.get("a") == 1 and lru.get("c") == 3
+    assert lru.evictions == 1
+
+
+def test_put_overwrites_without_growing():
+    lru = LRUCache(maxsize=2)
+    lru.put("a", 1)
+    lru.put("a", 2)
+    assert len(lru) == 1
+    assert lru.get("a") == 2
+
+
+def test_get_returns_default_on_miss():
+    lru = LRUCache()
+    assert lru.get("missing", "fallback") == "fallback"
+    assert lru.misses == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    lru = LRUCache(maxsize=4, ttl=10)
+    lru.put("a", 1)
+
+    clock.now += 9.9
+    assert lru.get("a") == 1
+
+    clock.now += 0.1
+    assert lru.get("a") is None
+    assert len(lru) == 0
+    stats = lru.get_stats()
+    assert stats["expirations"] == 1 and stats["evictions"] == 0
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_put_refreshes_ttl(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    lru = LRUCache(ttl=10)
+    lru.put("a", 1)
+    clock.now += 8
+    lru.put("a", 2)
+    clock.now += 8
+    assert lru.get("a") == 2
+
+
+def test_without_ttl_entries_never_expire(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    lru = LRUCache()
+    lru.put("a", 1)
+    clock.now += 10 ** 9
+    assert lru.get("a") == 1
+
+
+def test_stats_hit_rate():
+    lru = LRUCache(maxsize=8)
+    lru.put("a", 1)
+    lru.get("a")
+    lru.get("a")
+    lru.get("b")
+    stats = lru.get_stats()
+    assert stats["size"] == 1 and stats["maxsize"] == 8
+    assert stats["hit_rate"] == round(2 / 3, 3)
@@ -0,0 +1,65 @@
+"""BM25Index add/remove, identifier matching and generation filtering."""
+
+from backend.rag.lexical_index import BM25Index, tokenize
+
+
+def _index():
+    index = BM25Index()
+    index.add("a", "Patch CVE-2024-1234 on the gateway before Friday", generation=1)
+    index.add("b", "The gateway firewall blocks SQL injection attempts", generation=1)
+    index.add("c", "Quarterly report on sales and marketing", generation=2)
+    return index
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    tokens = tokenize("Upgrade to v1.2.3 for the user_id fix")
+    assert "v1.2.3" in tokens and "v1" in tokens and "3" in tokens
+    assert "user_id" in tokens
+    assert "the" not in tokens and "for" not in tokens
+
+
+def test_search_ranks_matching_chunks():
+    index = _index()
+    assert [cid for cid, _ in index.search("CVE-2024-1234", k=5)] == ["a"]
+    ranked = index.search("gateway firewall", k=5)
+    assert [cid for cid, _ in ranked] == ["b", "a"]
+    assert ranked[0][1] > ranked[1][1] > 0
+
+
+def test_search_respects_k_and_min_score():
+    index = _index()
+    assert len(index.search("gateway", k=1)) == 1
+    assert index.search("gateway", k=5, min_score=100.0) == []
+    assert index.search("the and of", k=5) == []  # Stopwords only
+
+
+def test_generation_filter_hides_newer_chunks():
+    index = _index()
+    assert index.search("quarterly report", k=5, max_generation=1) == []
+    assert [cid for cid, _ in index.search("quarterly report", k=5, max_generation=2)] == ["c"]
+    assert [cid for cid, _ in index.search("quarterly report", k=5)] == ["c"]
+
+
+def test_remove_drops_chunks_and_their_terms():
+    index = _index()
+    index.remove(["a", "missing"])
+    assert len(index) == 2
+    assert index.search("CVE-2024-1234", k=5) == []
+    assert "cve-2024-1234" not in index._postings
+    assert [cid for cid, _ in index.search("gateway", k=5)] == ["b"]
+
+
+def test_add_replaces_existing_id():
+    index = _index()
+    index.add("a", "Completely different text about onboarding", generation=3)
+    assert len(index) == 3
+    assert index.search("CVE-2024-1234", k=5) == []
+    assert [cid for cid, _ in index.search("onboarding", k=5, max_generation=3)] == ["a"]
+    assert index.search("onboarding", k=5, max_generation=2) == []
+
+
+def test_clear_empties_the_index():
+    index = _index()
+    index.clear()
+    assert len(index) == 0
+    assert index.search("gateway", k=5) == []
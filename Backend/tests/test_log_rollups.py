@@ -0,0 +1,104 @@
+"""Rollups bucketing, merging across buckets, percentiles and history replay."""
+
+import datetime
+
+import pytest
+
+from backend.services.log_rollups import LATENCY_BUCKETS_MS, Rollups
+
+UTC = datetime.timezone.utc
+T0 = datetime.datetime(2026, 1, 1, 12, 0, 0, tzinfo=UTC)
+
+
+def _at(minutes, seconds=0):
+    return T0 + datetime.timedelta(minutes=minutes, seconds=seconds)
+
+
+def _entry(decision="ALLOW", reason="", stopped_by="-", attack_type=None):
+    return {"decision": decision, "reason": reason, "stopped_by": stopped_by, "attack_type": attack_type}
+
+
+def test_records_land_in_minute_and_hour_buckets():
+    rollups = Rollups()
+    rollups.record(_entry(), 20, when=_at(0, 5))
+    rollups.record(_entry("BLOCK", "sql_injection: UNION", "firewall", "sql_injection"), 40, when=_at(0, 50))
+    rollups.record(_entry(), 300, when=_at(1, 10))
+
+    minute = rollups.stats("minute")
+    assert [b["start"] for b in minute["buckets"]] == ["2026-01-01T12:00:00Z", "2026-01-01T12:01:00Z"]
+    assert [b["total"] for b in minute["buckets"]] == [2, 1]
+
+    hour = rollups.stats("hour")
+    assert len(hour["buckets"]) == 1
+    totals = hour["totals"]
+    assert totals["total"] == 3
+    assert totals["by_decision"] == {"ALLOW": 2, "BLOCK": 1}
+    assert totals["by_reason"] == {"-": 2, "sql_injection": 1}  # Free-text detail dropped
+    assert totals["by_stopped_by"] == {"-": 2, "firewall": 1}
+    assert totals["by_attack_type"] == {"sql_injection": 1}
+    assert totals["block_rate"] == round(1 / 3, 4)
+
+
+def test_totals_merge_buckets_and_percentiles_use_histogram_bounds():
+    rollups = Rollups()
+    latencies = [3, 7, 7, 20, 40, 90, 200, 400, 900, 200000]
+    for i, latency in enumerate(latencies):
+        rollups.record(_entry(), latency, when=_at(i))
+
+    stats = rollups.stats("minute")
+    assert len(stats["buckets"]) == len(latencies)
+    latency = stats["totals"]["latency_ms"]
+    assert latency["count"] == len(latencies)
+    assert latency["avg"] == round(sum(latencies) / len(latencies), 1)
+    assert latency["p50"] == 50  # 5th value (40 ms) falls in the <= 50 bucket
+    assert latency["p90"] == 1000  # 9th value (900 ms)
+    assert latency["p99"] is None  # Past the last bound
+    assert stats["latency_buckets_ms"] == list(LATENCY_BUCKETS_MS)
+
+
+def test_since_until_select_buckets():
+    rollups = Rollups()
+    for i in range(5):
+        rollups.record(_entry(), when=_at(i, 30))
+
+    stats = rollups.stats("minute", since="2026-01-01T12:01:45", until="2026-01-01T12:03:00Z")
+    assert [b["start"] for b in stats["buckets"]] == ["2026-01-01T12:01:00Z", "2026-01-01T12:02:00Z",
+                                                     "2026-01-01T12:03:00Z"]
+    assert stats["totals"]["total"] == 3
+    assert rollups.stats("minute", until="2026-01-01")["totals"]["total"] == 5  # Whole day
+
+
+def test_decisions_without_latency_are_counted_only():
+    rollups = Rollups()
+    rollups.record(_entry(), when=_at(0))
+    latency = rollups.stats("minute")["totals"]["latency_ms"]
+    assert latency["count"] == 0 and latency["avg"] is None and latency["p50"] is None
+
+
+def test_oldest_buckets_are_evicted():
+    rollups = Rollups({"minute": (60, 3)})
+    for i in (5, 0, 1, 2, 3):  # One arrives late
+        rollups.record(_entry(), when=_at(i))
+    assert [b["start"][11:19] for b in rollups.stats("minute")["buckets"]] == ["12:02:00", "12:03:00", "12:05:00"]
+
+
+def test_unknown_resolution_is_rejected():
+    with pytest.raises(ValueError):
+        Rollups().stats("day")
+
+
+def test_load_replays_each_resolution_within_its_retention():
+    rollups = Rollups({"minute": (60, 10), "hour": (3600, 48)})
+    now = datetime.datetime.now(UTC)
+    rows = [
+        {"timestamp": (now - datetime.timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M:%S") + "Z", **_entry()}
+        for h in (30, 5, 0)
+    ]
+    rows.append({"timestamp": (now + datetime.timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%S") + "Z",
+                 **_entry("BLOCK")})
+
+    rollups.load(rows, until=now.strftime("%Y-%m-%dT%H:%M:%S") + "Z")
+    assert rollups.loading is False
+    assert rollups.stats("hour")["totals"]["total"] == 3  # The row past until is skipped
+    assert rollups.stats("minute")["totals"]["total"] == 1  # Only the row inside 10 minutes
+    assert rollups.stats("minute")["complete"] is True
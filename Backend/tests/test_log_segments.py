@@ -0,0 +1,99 @@
+"""tail_rows quote-parity parsing, segment rotation and recent_rows across segments."""
+
+import csv
+import gzip
+
+import pytest
+
+from backend.services import log_segments
+
+FIELDS = ["timestamp", "query", "decision", "reason", "stopped_by"]
+
+# Queries with embedded newlines, quotes and commas, so a naive backwards
+# scan would cut records in the wrong place
+QUERIES = [
+    "plain question",
+    'line one\nline two "quoted"',
+    'trailing quote "',
+    "comma, separated\n\nand blank lines",
+    '""',
+    "\n",
+]
+
+
+def _row(i):
+    return {
+        "timestamp": f"2026-01-01T00:{i // 60:02d}:{i % 60:02d}Z",
+        "query": QUERIES[i % len(QUERIES)] + f" #{i}",
+        "decision": "BLOCK" if i % 2 else "ALLOW",
+        "reason": "",
+        "stopped_by": "-",
+    }
+
+
+def _write_csv(path, rows):
+    with path.open("w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 64, 64 * 1024])
+@pytest.mark.parametrize("n", [1, 2, 5, 29, 30, 100])
+def test_tail_rows_matches_csv_reader(tmp_path, monkeypatch, block_size, n):
+    monkeypatch.setattr(log_segments, "TAIL_BLOCK_SIZE", block_size)
+    rows = [_row(i) for i in range(30)]
+    path = tmp_path / "detections.csv"
+    _write_csv(path, rows)
+    assert log_segments.tail_rows(path, n, FIELDS) == rows[-n:]
+
+
+def test_tail_rows_of_empty_or_missing_file(tmp_path):
+    path = tmp_path / "detections.csv"
+    assert log_segments.tail_rows(path, 10, FIELDS) == []
+    _write_csv(path, [])
+    assert log_segments.tail_rows(path, 10, FIELDS) == []
+    assert log_segments.tail_rows(path, 0, FIELDS) == []
+
+
+def test_rotate_segment_gzips_and_indexes(tmp_path):
+    rows = [_row(i) for i in range(10)]
+    live = tmp_path / "detections.csv"
+    segments = tmp_path / "segments"
+    _write_csv(live, rows)
+
+    entry = log_segments.rotate_segment(live, segments, FIELDS, tail_size=4)
+    assert not live.exists()
+    assert entry["start"] == rows[0]["timestamp"] and entry["end"] == rows[-1]["timestamp"]
+    assert entry["tail_complete"] is False
+    assert log_segments.load_index(segments) == [entry]
+    with gzip.open(segments / entry["file"], "rt", encoding="utf-8", newline="") as f:
+        assert list(csv.DictReader(f)) == rows
+    assert log_segments.tail_rows(segments / entry["tail_file"], 10, FIELDS) == rows[-4:]
+
+
+def test_rotate_empty_file_is_a_no_op(tmp_path):
+    live = tmp_path / "detections.csv"
+    _write_csv(live, [])
+    assert log_segments.rotate_segment(live, tmp_path / "segments", FIELDS) is None
+    assert live.exists()
+
+
+def test_recent_rows_spans_live_file_and_segments(tmp_path, monkeypatch):
+    rows = [_row(i) for i in range(25)]
+    live = tmp_path / "detections.csv"
+    segments = tmp_path / "segments"
+    for chunk in (rows[:10], rows[10:20]):
+        _write_csv(live, chunk)
+        log_segments.rotate_segment(live, segments, FIELDS, tail_size=3)
+    _write_csv(live, rows[20:])
+
+    newest_first = rows[::-1]
+    # Within the tail files: no segment is decompressed
+    monkeypatch.setattr(log_segments, "_segment_tail", lambda *a: pytest.fail("decompressed a segment"))
+    assert log_segments.recent_rows(live, segments, 8, FIELDS) == newest_first[:8]
+
+    # Beyond them the segment is streamed for the rest
+    monkeypatch.undo()
+    assert log_segments.recent_rows(live, segments, 12, FIELDS) == newest_first[:12]
+    assert log_segments.recent_rows(live, segments, 100, FIELDS) == newest_first
@@ -0,0 +1,85 @@
+"""The background log writer persists rows, survives failed rotations and is restarted if it dies."""
+
+import csv
+import time
+
+import pytest
+
+from backend.services import log_segments, logging_service
+
+
+@pytest.fixture
+def logs(tmp_path, monkeypatch):
+    """Point the log files at tmp_path with a fresh writer, store and counters."""
+    monkeypatch.setattr(logging_service, "LOG_DIR", tmp_path)
+    monkeypatch.setattr(logging_service, "LOG_FILE", tmp_path / "detections.csv")
+    monkeypatch.setattr(logging_service, "LOG_DB", tmp_path / "detections.db")
+    monkeypatch.setattr(logging_service, "LOG_SEGMENTS_DIR", tmp_path / "segments")
+    monkeypatch.setattr(logging_service, "LOG_FLUSH_INTERVAL", 0.01)
+    monkeypatch.setattr(logging_service, "_store", None)
+    monkeypatch.setattr(logging_service, "_writer_thread", None)
+    monkeypatch.setattr(logging_service, "_writer_stats", dict.fromkeys(logging_service._writer_stats, 0))
+    yield tmp_path
+    logging_service.flush_logs()
+
+
+def _wait_for(stat, count, timeout=5.0):
+    """Wait until the writer's stat counter reaches count."""
+    deadline = time.monotonic() + timeout
+    while logging_service.get_log_writer_stats()[stat] < count:
+        assert time.monotonic() < deadline, "writer did not catch up"
+        time.sleep(0.01)
+
+
+def _csv_queries(path):
+    with path.open(encoding="utf-8", newline="") as f:
+        return [row["query"] for row in csv.DictReader(f)]
+
+
+def test_rows_reach_csv_and_store(logs):
+    logging_service.log_decision("first", {"decision": "BLOCK", "attack_type": "sql_injection"})
+    logging_service.log_decision("second", {"decision": "ALLOW"})
+    logging_service.flush_logs()
+
+    assert _csv_queries(logs / "detections.csv") == ["first", "second"]
+    stored = logging_service.get_logs(limit=10)["logs"]
+    assert [row["query"] for row in stored] == ["second", "first"]
+    assert stored[1]["attack_type"] == "sql_injection"
+
+
+def test_writer_survives_failed_rotation(logs, monkeypatch):
+    monkeypatch.setattr(logging_service, "LOG_ROTATE_BYTES", 1)  # Rotate after every batch
+    real_rotate = log_segments.rotate_segment
+    calls = []
+
+    def rotate_once_failing(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise OSError("disk full")
+        return real_rotate(*args, **kwargs)
+
+    monkeypatch.setattr(log_segments, "rotate_segment", rotate_once_failing)
+
+    logging_service.log_decision("before", {})
+    _wait_for("errors", 1)
+    logging_service.log_decision("after", {})
+    _wait_for("rotations", 1)
+
+    assert logging_service._writer_thread.is_alive()
+    stats = logging_service.get_log_writer_stats()
+    assert stats["errors"] == 1 and stats["rotations"] == 1
+    assert [row["query"] for row in logging_service.tail_logs(10)] == ["after", "before"]
+
+
+def test_dead_writer_is_restarted(logs):
+    logging_service.log_decision("first", {})
+    _wait_for("written", 1)
+    dead = logging_service._writer_thread
+    logging_service._write_queue.put(logging_service._STOP)
+    dead.join(5)
+    assert not dead.is_alive()
+
+    logging_service.log_decision("second", {})
+    _wait_for("written", 2)
+    assert logging_service._writer_thread is not dead
+    assert logging_service._writer_thread.is_alive()
@@ -0,0 +1,95 @@
+"""SingleFlight shares one execution between concurrent callers, errors included."""
+
+import threading
+import time
+
+import pytest
+
+from backend.utils.singleflight import SingleFlight
+
+WAITERS = 5
+
+
+def _call_concurrently(group, key, fn, count):
+    """Run group.do(key, fn) from count threads; returns [(result, error)] per thread."""
+    outcomes = [None] * count
+
+    def work(i):
+        try:
+            outcomes[i] = (group.do(key, fn), None)
+        except Exception as e:
+            outcomes[i] = (None, e)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    return threads, outcomes
+
+
+def _wait_for_waiters(group, key, count):
+    """Block until count callers are queued behind the leader's call."""
+    while True:
+        with group._lock:
+            call = group._calls.get(key)
+            if call is not None and call.waiters == count:
+                return
+        time.sleep(0.001)
+
+
+def test_concurrent_calls_share_one_execution():
+    group = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def fn():
+        runs.append(1)
+        release.wait()
+        return {"answer": [1, 2]}
+
+    threads, outcomes = _call_concurrently(group, "q", fn, WAITERS + 1)
+    _wait_for_waiters(group, "q", WAITERS)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(runs) == 1
+    assert [result for result, _ in outcomes] == [{"answer": [1, 2]}] * (WAITERS + 1)
+    results = [result for result, _ in outcomes]
+    assert len({id(r) for r in results}) == len(results)  # Every caller got its own copy
+    assert group.get_stats() == {"in_flight": 0, "executed": 1, "shared": WAITERS}
+
+
+def test_error_reaches_every_caller():
+    group = SingleFlight()
+    release = threading.Event()
+
+    def fn():
+        release.wait()
+        raise RuntimeError("llm down")
+
+    threads, outcomes = _call_concurrently(group, "q", fn, WAITERS + 1)
+    _wait_for_waiters(group, "q", WAITERS)
+    release.set()
+    for t in threads:
+        t.join()
+
+    errors = [error for _, error in outcomes]
+    assert all(isinstance(e, RuntimeError) and str(e) == "llm down" for e in errors)
+    assert group.get_stats()["in_flight"] == 0
+
+
+def test_finished_calls_are_not_cached():
+    group = SingleFlight()
+    values = iter([1, 2])
+    assert group.do("q", lambda: next(values)) == 1
+    assert group.do("q", lambda: next(values)) == 2
+    assert group.get_stats() == {"in_flight": 0, "executed": 2, "shared": 0}
+
+
+def test_different_keys_run_separately():
+    group = SingleFlight()
+    assert group.do("a", lambda: "a") == "a"
+    assert group.do("b", lambda: "b") == "b"
+    with pytest.raises(ValueError):
+        group.do("c", lambda: int("x"))
+    assert group.get_stats()["executed"] == 3
@@ -0,0 +1,92 @@
+"""
+Publish/subscribe fan-out for server-sent events.
+Every subscriber gets every event: each has its own bounded ring buffer, so a
+slow consumer loses its oldest undelivered events (counted) instead of
+holding up the publisher or other subscribers. Events carry increasing ids and
+a short history is kept, so a reconnecting client can resume after the last
+id it saw (the SSE Last-Event-ID header).
+"""
+
+import threading
+from collections import deque
+
+
+class _Subscriber:
+    __slots__ = ("buffer", "dropped")
+
+    def __init__(self, size):
+        self.buffer = deque(maxlen=size)
+        self.dropped = 0
+
+
+class Broadcaster:
+    """Thread-safe (and gevent-safe once monkey-patched) event fan-out."""
+
+    def __init__(self, buffer_size: int = 256, history_size: int = 1000):
+        self.buffer_size = buffer_size
+        self._history = deque(maxlen=history_size)  # (event id, data)
+        self._subscribers = set()
+        self._cond = threading.Condition()
+        self._last_id = 0
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, data: str) -> int:
+        """Queue data for every current subscriber; returns its event id."""
+        with self._cond:
+            self._last_id += 1
+            event = (self._last_id, data)
+            self._history.append(event)
+            for sub in self._subscribers:
+                if len(sub.buffer) == sub.buffer.maxlen:
+                    sub.dropped += 1
+                    self.dropped += 1
+                sub.buffer.append(event)
+            self.published += 1
+            self._cond.notify_all()
+            return self._last_id
+
+    def _replay(self, last_event_id):
+        """History after last_event_id; all of it if that id is unknown (e.g. before a restart)."""
+        try:
+            last_event_id = int(last_event_id)
+        except (TypeError, ValueError):
+            return []
+        if last_event_id > self._last_id or (self._history and last_event_id < self._history[0][0] - 1):
+            return list(self._history)
+        return [event for event in self._history if event[0] > last_event_id]
+
+    def subscribe(self, last_event_id=None, heartbeat: float = 15.0):
+        """
+        Generator of (event id, data) for this subscriber, or None every
+        `heartbeat` seconds without events (so callers can keep the connection alive).
+        Unsubscribes when the generator is closed.
+        """
+        sub = _Subscriber(self.buffer_size)
+        with self._cond:
+            missed = self._replay(last_event_id)
+            self._subscribers.add(sub)
+        try:
+            yield from missed
+            while True:
+                with self._cond:
+                    if not sub.buffer:
+                        self._cond.wait(heartbeat)
+                    events = list(sub.buffer)
+                    sub.buffer.clear()
+                if not events:
+                    yield None
+                for event in events:
+                    yield event
+        finally:
+            with self._cond:
+                self._subscribers.discard(sub)
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            return {
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "dropped": self.dropped,
+                "last_event_id": self._last_id,
+            }
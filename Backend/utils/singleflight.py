@@ -0,0 +1,65 @@
+"""
+Single-flight call deduplication.
+Concurrent calls with the same key share one execution: the first caller runs
+the function, the others wait for it and receive a copy of its result (or its
+exception). Nothing is cached once the call finishes.
+"""
+
+import copy
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Thread-safe single-flight group with shared/executed counters."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) unless a call for key is already in flight, then share its outcome."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                call.waiters += 1
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # Each caller gets its own copy, so callers can't mutate each other's result
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                shared = call.waiters > 0
+            call.done.set()
+        return copy.deepcopy(call.result) if shared else call.result
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {"in_flight": in_flight, "executed": self.executed, "shared": self.shared}
@@ -70,21 +70,18 @@ export default function useFirewall() {
     if (typeof window === "undefined") return; // client-side only
     (async () => {
       try {
-        const res = await fetch("http://localhost:5200/logs", {
+        const res = await fetch("http://localhost:5200/logs?limit=200&aggregates=1", {
           headers: { Accept: "application/json" },
         });
         if (!res.ok) throw new Error(`HTTP ${res.status}`);
         const data = await res.json();
 
-        // Old logs in reverse order (latest first)
-        const latestLogs = data.reverse().slice(0, 200);
-        setLogs(latestLogs);
+        // Latest logs come first; counts cover the whole log
+        setLogs(data.logs);
 
-        const total = latestLogs.length;
-        const blocks = latestLogs.filter(
-          (l) => l.decision === "BLOCK" || l.decision === "QUARANTINE"
-        ).length;
-        setStats({ total_queries: total, total_blocks: blocks });
+        const byDecision = data.aggregates.by_decision;
+        const blocks = (byDecision.BLOCK || 0) + (byDecision.QUARANTINE || 0);
+        setStats({ total_queries: data.aggregates.total, total_blocks: blocks });
       } catch (err) {
         console.warn("⚠️ Could not load previous logs:", err);
       }